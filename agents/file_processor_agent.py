@@ -1,16 +1,88 @@
 import asyncio
+import atexit
+import functools
 import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
 from autogen_agentchat.agents import AssistantAgent
 from tools.parse_csv_tool import parse_csv_file
-from tools.extract_text_pdf import extract_text_from_pdf
+from tools.extract_text_pdf import extract_text_from_pdf, extract_text_from_pdf_stream, cached_pdf_text, remember_pdf_text
 from tools.parse_unstructured_text import parse_unstructured_text
 from tools.standardize_data import standardize_data
+from tools.parse_cache import file_digest, text_digest, load_cached, store_cached
 from agents.prompts.file_processor_message import FILE_PROCESSOR_SYSTEM_MESSAGE
+from config.constants import MAX_CONCURRENT_PDF_PARSES, PAGES_PER_PARSE_BATCH, MAX_PARSE_BATCH_CHARS
+
+# Shared process pool for CPU-bound PDF decoding, so several PDFs can be
+# extracted in parallel without contending for the GIL. It is created on
+# first use rather than at import, and uses "spawn" because forking a process
+# that already runs an event loop and client threads is unsafe.
+_PDF_EXTRACT_POOL = None
+
+def _get_pdf_extract_pool() -> ProcessPoolExecutor:
+    """Returns the shared PDF extraction pool, creating it on first use."""
+    global _PDF_EXTRACT_POOL
+    if _PDF_EXTRACT_POOL is None:
+        _PDF_EXTRACT_POOL = ProcessPoolExecutor(
+            max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+        atexit.register(_PDF_EXTRACT_POOL.shutdown)
+    return _PDF_EXTRACT_POOL
+
+def _collect_transactions(parsed_results: List[str]) -> tuple[list, list]:
+    """Splits a list of parser/tool JSON results into transactions and error messages."""
+    transactions = []
+    errors = []
+    for parsed_json_result in parsed_results:
+        parsed_data = json.loads(parsed_json_result)
+        if isinstance(parsed_data, dict) and "error" in parsed_data:
+            errors.append(parsed_data["error"])
+        elif isinstance(parsed_data, list):
+            transactions.extend(parsed_data)
+    return transactions, errors
+
+def _split_batch_result(batch_result: str, batch: List[tuple]) -> dict:
+    """
+    Splits one batch parse back into per-page JSON results, keyed by page key.
+
+    The parser tags every transaction with the `page` number of its marker.
+    When every transaction carries a page from this batch, each page's share
+    is stored in the per-page cache, so a later run that changes one page
+    does not re-parse its neighbours. Otherwise (an error object, or untagged
+    transactions) the whole result is attributed to the batch's first page
+    and nothing is cached per page.
+    """
+    page_keys = {number: key for key, number, _ in batch}
+    try:
+        parsed = json.loads(batch_result)
+    except ValueError:
+        parsed = None
+
+    if isinstance(parsed, list) and all(
+        isinstance(t, dict) and t.get("page") in page_keys for t in parsed
+    ):
+        by_page = {number: [] for number in page_keys}
+        for transaction in parsed:
+            by_page[transaction.pop("page")].append(transaction)
+        results = {}
+        for number, transactions in by_page.items():
+            page_json = json.dumps(transactions)
+            store_cached(page_keys[number], page_json)
+            results[page_keys[number]] = page_json
+        return results
+
+    first_key = batch[0][0]
+    return {key: (batch_result if key == first_key else "[]") for key, _, _ in batch}
 
 def get_file_processor_agent(model_client, code_executor) -> AssistantAgent:
     """
     Creates and configures the FileProcessorAgent with all its necessary tools.
 
+    A fresh agent is built on every call: an AssistantAgent keeps its model
+    context across runs, so sharing one instance between teams would carry
+    the previous conversation into the next run.
+
     Args:
         model_client: The language model client for the agent.
         code_executor: The code executor instance, which is required by the
@@ -20,41 +92,172 @@ def get_file_processor_agent(model_client, code_executor) -> AssistantAgent:
         A configured AssistantAgent ready to process files.
     """
 
-    def process_pdf_file(file_path: str) -> str:
+    # Caps how many parse conversations hit the LLM at once, across all tools.
+    # Built per agent, so it is bound to the loop of the run that uses it.
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_PDF_PARSES)
+    model_name = getattr(model_client, "_raw_config", {}).get("model", type(model_client).__name__)
+
+    async def parse_with_limit(unstructured_text: str) -> str:
+        # Identical text (e.g. an unchanged page of a re-run statement) is
+        # served from the on-disk cache instead of another LLM conversation.
+        cache_key = text_digest(unstructured_text, model_name)
+        cached = load_cached(cache_key)
+        if cached is not None:
+            return cached
+
+        async with semaphore:
+            parsed_json_result = await parse_unstructured_text(unstructured_text, model_client, code_executor)
+
+        if not parsed_json_result.lstrip().startswith("{"):
+            store_cached(cache_key, parsed_json_result)
+        return parsed_json_result
+
+    # Async tool: AutoGen awaits it on its own running loop, so the parse step
+    # reuses that loop (and the model client's connections) instead of paying
+    # for a fresh `asyncio.run` loop on every call.
+    async def process_pdf_file(file_path: str) -> str:
         """
         A tool that performs the full PDF processing workflow.
-        1. Extracts raw text from the PDF.
-        2. Parses the unstructured text into a JSON string of transactions.
-        3. Standardizes the transaction data and returns the final JSON string.
+        1. Extracts raw text from the PDF, page by page.
+        2. Parses batches of the distinct, uncached pages into transactions concurrently.
+        3. Standardizes the combined transaction data and returns the final JSON string.
         """
         try:
-            # Step 1: Extract text using the tool
-            unstructured_text = extract_text_from_pdf(file_path)
-            if "Error extracting text" in unstructured_text:
-                return json.dumps({"error": unstructured_text})
-
-            # Step 2: Parse the unstructured text
-            parsed_json_result = asyncio.run(
-                parse_unstructured_text(unstructured_text, model_client, code_executor)
+            # A byte-identical PDF that was already processed is returned as-is.
+            file_key = text_digest(file_digest(file_path), model_name)
+            cached = load_cached(file_key)
+            if cached is not None:
+                return cached
+
+            # Each page is keyed by its own text. Identical pages (repeated
+            # boilerplate) are parsed once, and pages already parsed on an
+            # earlier run are served from the per-page cache.
+            page_results = {}
+            page_order = []
+            seen_pages = set()
+            parse_tasks = []
+
+            # Each parse is a whole LLM conversation with a fixed per-request
+            # cost, so the uncached pages are grouped into one parse (marked
+            # with `=== PAGE n ===`) instead of paying that cost per page.
+            async def parse_batch(batch: List[tuple]) -> None:
+                batch_result = await parse_with_limit(
+                    "\n".join(f"=== PAGE {number} ===\n{text}" for _, number, text in batch)
+                )
+                page_results.update(_split_batch_result(batch_result, batch))
+
+            def submit_batch(batch: List[tuple]) -> None:
+                parse_tasks.append(asyncio.create_task(parse_batch(batch)))
+
+            # Step 1 + 2: Stream pages out of the PDF and start parsing each
+            # batch as soon as it fills up, so LLM round-trips overlap the
+            # decode of the remaining pages.
+            batch = []
+            batch_chars = 0
+            page_number = 0
+            async for page_text in extract_text_from_pdf_stream(file_path):
+                page_number += 1
+                if not (page_text and page_text.strip()):
+                    continue
+                page_key = text_digest(page_text, model_name)
+                page_order.append(page_key)
+                if page_key in seen_pages:
+                    continue
+                seen_pages.add(page_key)
+                cached_page = load_cached(page_key)
+                if cached_page is not None:
+                    page_results[page_key] = cached_page
+                    continue
+                if batch and (len(batch) >= PAGES_PER_PARSE_BATCH
+                              or batch_chars + len(page_text) > MAX_PARSE_BATCH_CHARS):
+                    submit_batch(batch)
+                    batch, batch_chars = [], 0
+                batch.append((page_key, page_number, page_text))
+                batch_chars += len(page_text)
+            if batch:
+                submit_batch(batch)
+
+            if not page_order:
+                return json.dumps({"error": f"No text could be extracted from {file_path}"})
+
+            # Concatenate the per-page transactions, keeping page order.
+            await asyncio.gather(*parse_tasks)
+            transactions, errors = _collect_transactions(
+                [page_results.get(page_key, "[]") for page_key in page_order]
             )
-            # Check if the result is an error message before standardizing.
-            parsed_data = json.loads(parsed_json_result)
-            if "error" in parsed_data:
-                return parsed_json_result
 
-            # Step 3: Standardize the data using the tool
-            final_json = standardize_data(parsed_json_result)
+            # Only surface an error if no page produced any data.
+            if errors and not transactions:
+                return json.dumps({"error": "; ".join(errors)})
+
+            # Step 3: Standardize the combined data once using the tool
+            final_json = standardize_data(transactions)
+            if not errors:
+                store_cached(file_key, final_json)
             return final_json
 
         except Exception as e:
             return json.dumps({"error": f"Failed to process PDF file: {str(e)}"})
-    
-    # The tool list is now simplified to the two main file-processing tasks
-    # and the standalone standardize tool.
+
+    async def process_files_batch(file_paths: List[str]) -> str:
+        """
+        A tool that processes a whole list of CSV and PDF files in a single call.
+        1. Extracts text from all PDFs in parallel and parses each one as soon as it is ready.
+        2. Parses all CSV files in parallel.
+        3. Combines every transaction and standardizes them into one final JSON string.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+            pdf_paths = [p for p in file_paths if p.lower().endswith(".pdf")]
+            csv_paths = [p for p in file_paths if p.lower().endswith(".csv")]
+            errors = [f"Unsupported file type: {p}" for p in file_paths if p not in pdf_paths and p not in csv_paths]
+
+            # CSV parsing is I/O-bound, so threads are enough.
+            csv_tasks = [asyncio.create_task(asyncio.to_thread(parse_csv_file, p)) for p in csv_paths]
+
+            # PDF decoding is CPU-bound: fan it out to the process pool and hand
+            # each document to the LLM parser as soon as its text comes back.
+            # Each file is already in its own worker, so page extraction stays in-process.
+            # Text extracted on an earlier call is reused from this process's
+            # LRU; workers don't share it, so results are remembered here.
+            async def extract(path: str) -> str:
+                text = cached_pdf_text(path)
+                if text is None:
+                    text = await loop.run_in_executor(
+                        _get_pdf_extract_pool(), functools.partial(extract_text_from_pdf, path, max_workers=1)
+                    )
+                    if not text.startswith("Error extracting text"):
+                        remember_pdf_text(path, text)
+                return text
+
+            parse_tasks = []
+            for extract_future in asyncio.as_completed([extract(p) for p in pdf_paths]):
+                unstructured_text = await extract_future
+                if unstructured_text.startswith("Error extracting text"):
+                    errors.append(unstructured_text)
+                    continue
+                parse_tasks.append(asyncio.create_task(parse_with_limit(unstructured_text)))
+
+            transactions, parse_errors = _collect_transactions(
+                await asyncio.gather(*parse_tasks, *csv_tasks)
+            )
+            errors.extend(parse_errors)
+
+            if errors and not transactions:
+                return json.dumps({"error": "; ".join(errors)})
+
+            # Standardize everything once at the end.
+            return standardize_data(transactions)
+
+        except Exception as e:
+            return json.dumps({"error": f"Failed to process files: {str(e)}"})
+
+    # Standardization happens inside the PDF tools, so it is not exposed as
+    # a separate tool.
     tools_list = [
+        process_files_batch,
         parse_csv_file,
         process_pdf_file,
-        # standardize_data
     ]
 
     # Pass the list of tools directly to the agent's constructor.
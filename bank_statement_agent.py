@@ -1,9 +1,14 @@
 # #!/usr/bin/env python3
 #!/usr/bin/env python3
 import os
+import sys
 import asyncio
 import json
 import re
+import hashlib
+import httpx
+from contextlib import asynccontextmanager
+from pathlib import Path
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_agentchat.agents import AssistantAgent, CodeExecutorAgent
 from autogen_agentchat.teams import RoundRobinGroupChat
@@ -11,56 +16,438 @@ from autogen_agentchat.conditions import MaxMessageTermination
 from autogen_agentchat.messages import TextMessage
 from autogen_ext.code_executors.local import LocalCommandLineCodeExecutor
 from autogen_ext.code_executors.docker import DockerCommandLineCodeExecutor
-from autogen_agentchat.ui import Console
+from autogen_agentchat.base import TaskResult, TerminationCondition
+from autogen_agentchat.messages import BaseAgentEvent, BaseChatMessage, StopMessage
+from typing import Sequence
+from autogen_core.models import SystemMessage, UserMessage
+from autogen_core import CancellationToken
+from autogen_core.code_executor import CodeBlock
+from tools.script_cache import text_fingerprint, lookup_script, store_script, forget_script
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# orjson is a much faster drop-in for the JSON we parse and save; fall back to
+# the stdlib when it is not installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_loads(text: str):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+def json_dumps(obj, indent: bool = False) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False)
+
 # === CONFIGURATION ===
 BANK_STATEMENT_FILE = "temp/statement.txt"  # Text file containing raw statement
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")  # Default model
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY2")  # Must be set in your .env
+CATEGORIZER_MODEL = os.getenv("CATEGORIZER_MODEL", "gpt-4.1-nano")  # Smaller, faster model for categorization
+DONE_MARKER = "__DONE__"  # The assistant says this to end the conversation
+STATEMENT_PREVIEW_LINES = 60  # Lines of the statement shown to the assistant; the rest is read from disk
 
 if not OPENAI_API_KEY:
     raise EnvironmentError("Please set the OPENAI_API_KEY2 environment variable.")
 
 # === Helper to read statement text ===
 def load_statement(file_path: str) -> str:
-    with open(file_path, "r", encoding="utf-8") as f:
-        return f.read()
+    # One binary read and one decode, no incremental text-mode decoding
+    return Path(file_path).read_bytes().decode("utf-8")
+
+# === Category cache (normalized description -> category) ===
+# Merchants repeat from statement to statement, so only descriptions that have
+# never been seen before are sent to the categorizer LLM.
+CATEGORY_CACHE_FILE = "category_cache.json"
+CATEGORIZE_BATCH_SIZE = 20  # Descriptions per categorizer request
+MAX_PARALLEL_CATEGORIZE = 8  # Concurrent categorizer requests
+
+_DESC_NOISE_RE = re.compile(r"[\d#*]+")
+_TRAILING_STATE_RE = re.compile(r"\s+[A-Z]{2}$")
+
+def normalize_description(description: str) -> str:
+    """Uppercases a description and strips store numbers and a trailing state code."""
+    desc = _DESC_NOISE_RE.sub(" ", str(description).upper())
+    desc = " ".join(desc.split())
+    return _TRAILING_STATE_RE.sub("", desc)
+
+def load_category_cache(file_path: str = CATEGORY_CACHE_FILE) -> dict:
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return json_loads(f.read())
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def save_category_cache(cache: dict, file_path: str = CATEGORY_CACHE_FILE) -> None:
+    # Write to a temp file and swap it in, so a crash never leaves a half-written cache
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json_dumps(cache))
+    os.replace(tmp_path, file_path)
+
+_CATEGORY_CACHE = load_category_cache()
+
+# ----------------------------
+# Robust JSON extraction logic
+# ----------------------------
+_JSON_DECODER = json.JSONDecoder()
+_FENCE_RE = re.compile(r"```(?:json|python)?", re.IGNORECASE)
+
+def extract_json_from_text(text: str):
+    """Return parsed JSON object found in text or None."""
+    if not text or not isinstance(text, str):
+        return None
+    if DONE_MARKER in text:
+        text = text.replace(DONE_MARKER, "")
 
-async def run_parsing_agent():
-    statement_text = load_statement(BANK_STATEMENT_FILE)
+    # Fast path: the executor is prompted to print bare JSON, so most of the
+    # time the whole message parses as-is and no stripping/scanning is needed.
+    stripped = text.strip()
+    if stripped.startswith("{"):
+        try:
+            return json_loads(stripped)
+        except ValueError:
+            pass
 
-    # Create the model client correctly
-    model_client = OpenAIChatCompletionClient(
-        model=OPENAI_MODEL, api_key=OPENAI_API_KEY
-    )
+    # strip common code fences
+    text2 = _FENCE_RE.sub("", text)
+
+    # Try quick parse if text is (mostly) JSON
+    stripped = text2.strip()
+    if stripped.startswith("{") and stripped.endswith("}"):
+        try:
+            return json_loads(stripped)
+        except Exception:
+            pass
+
+    # Find the first '{' that starts a complete JSON object. raw_decode parses
+    # from that offset in C and reports where the object ends, so there is no
+    # need to match braces by hand.
+    start = text2.find("{")
+    while start != -1:
+        try:
+            obj, _ = _JSON_DECODER.raw_decode(text2, start)
+            return obj
+        except ValueError:
+            # parsing failed; continue searching for next '{'
+            start = text2.find("{", start + 1)
+    return None
+
+
+# ----------------------------
+# Custom Termination condition (following Autogen 0.7.2 pattern)
+# ----------------------------
+class ExecutorJSONTermination(TerminationCondition):
+    """Terminates as soon as the executor prints valid JSON, instead of running out the turn budget."""
+
+    def __init__(self):
+        self._terminated = False
+
+    @property
+    def terminated(self) -> bool:
+        return self._terminated
+
+    async def __call__(self, messages: Sequence[BaseAgentEvent | BaseChatMessage]) -> StopMessage | None:
+        if self._terminated:
+            return None
+
+        for msg in messages:
+            if getattr(msg, "source", "") == "executor":
+                if extract_json_from_text(str(getattr(msg, "content", ""))) is not None:
+                    self._terminated = True
+                    return StopMessage(
+                        content="Valid JSON found in executor output.",
+                        source="ExecutorJSONTermination"
+                    )
+        return None
+
+    async def reset(self) -> None:
+        self._terminated = False
+
+class DoneAfterExecutionTermination(TerminationCondition):
+    """
+    Terminates when the assistant says DONE_MARKER after the executor has run.
+
+    A marker in the same reply as the first code block (before anything was
+    executed) is ignored, so the executor still gets to run that code.
+    """
+
+    def __init__(self):
+        self._terminated = False
+        self._executor_ran = False
+
+    @property
+    def terminated(self) -> bool:
+        return self._terminated
+
+    async def __call__(self, messages: Sequence[BaseAgentEvent | BaseChatMessage]) -> StopMessage | None:
+        if self._terminated:
+            return None
+
+        for msg in messages:
+            source = getattr(msg, "source", "")
+            if source == "executor":
+                self._executor_ran = True
+            elif source == "assistant" and self._executor_ran:
+                content = getattr(msg, "content", "")
+                if isinstance(content, str) and DONE_MARKER in content and "```" not in content:
+                    self._terminated = True
+                    return StopMessage(
+                        content="Assistant reported the parse as done.",
+                        source="DoneAfterExecutionTermination"
+                    )
+        return None
+
+    async def reset(self) -> None:
+        self._terminated = False
+        self._executor_ran = False
+
+# === Parser script cache ===
+# Scripts are keyed by the statement's structural fingerprint (see
+# tools/script_cache.py), prefixed so they never mix with the file processor's
+# scripts, which emit a different JSON shape.
+_PYTHON_BLOCK_RE = re.compile(r"```python\s*\n(.*?)```", re.DOTALL)
+
+def extract_python_code(content: str):
+    """Returns the python code blocks of an assistant message joined together, or None."""
+    blocks = _PYTHON_BLOCK_RE.findall(content)
+    return "\n\n".join(block.strip() for block in blocks) if blocks else None
+
+def has_parsed_transactions(parsed_json) -> bool:
+    """True if the JSON has a non-empty transactions_by_cardholder dict of lists with at least one transaction."""
+    if not isinstance(parsed_json, dict):
+        return False
+    by_cardholder = parsed_json.get("transactions_by_cardholder")
+    if not isinstance(by_cardholder, dict) or not by_cardholder:
+        return False
+    if not all(isinstance(txns, list) for txns in by_cardholder.values()):
+        return False
+    return any(by_cardholder.values())
+
+async def replay_parser_script(fingerprint: str, statement_file: str, code_executor):
+    """Runs the cached script for this layout; returns parsed JSON, or None (evicting a bad script)."""
+    cached = lookup_script(fingerprint)
+    if cached is None:
+        return None
+
+    script, cached_file = cached
+    print(f"Replaying cached parser script for layout {fingerprint[-12:]}")
+    try:
+        exec_result = await code_executor.execute_code_blocks(
+            [CodeBlock(code=script.replace(cached_file, statement_file), language="python")],
+            CancellationToken(),
+        )
+    except Exception as e:
+        print(f"Cached script execution failed: {e}")
+        exec_result = None
+
+    parsed_json = None
+    if exec_result is not None and exec_result.exit_code == 0:
+        parsed_json = extract_json_from_text(exec_result.output)
+    if not has_parsed_transactions(parsed_json):
+        print("Cached script did not produce transactions - falling back to the assistant")
+        forget_script(fingerprint)
+        return None
+    return parsed_json
+
+# === Categorizer prompt ===
+# Sent straight through the model client (no AgentChat agent), so the call can
+# start as soon as parsed JSON is available.
+CATEGORIZER_SYSTEM_MESSAGE = (
+    "Categorize transaction descriptions. Input: a JSON array of descriptions. "
+    "Output: only a JSON object {description exactly as given: category} covering every input.\n"
+    "Categories (use only these):\n"
+    "Food & Dining: groceries, restaurants, cafes, bars, food delivery\n"
+    "Merchandise & Services: retail, online marketplaces (Amazon), electronics, clothing, hobbies, "
+    "entertainment, streaming (Netflix), gyms, drugstores (CVS)\n"
+    "Bills & Subscriptions: utilities (phone, internet), insurance\n"
+    "Travel & Transportation: gas, Uber, transit, airlines, hotels, rental cars\n"
+    "Financial Transactions: payments, refunds, statement credits, fees, interest\n"
+    "Uncategorized: too vague, or none of the above\n"
+)
+
+async def categorize_transactions(parsed_json: dict, model_client) -> dict:
+    """Adds a 'category' to every transaction, asking the LLM only about unseen descriptions."""
+    transactions = [
+        txn
+        for txns in parsed_json.get("transactions_by_cardholder", {}).values()
+        for txn in txns
+    ]
+
+    misses = sorted({
+        normalize_description(txn.get("description", ""))
+        for txn in transactions
+    } - _CATEGORY_CACHE.keys())
+    print(f"Categories cached for {len(transactions)} transactions; {len(misses)} new descriptions to classify")
+
+    if misses:
+        # Classify in small batches concurrently instead of one long prompt;
+        # the semaphore keeps the number of in-flight requests under rate limits.
+        semaphore = asyncio.Semaphore(MAX_PARALLEL_CATEGORIZE)
+
+        async def classify(batch: list) -> dict:
+            async with semaphore:
+                # JSON mode: the API guarantees a JSON object, so no extraction is needed
+                result = await model_client.create(
+                    [
+                        SystemMessage(content=CATEGORIZER_SYSTEM_MESSAGE),
+                        UserMessage(content=json.dumps(batch, ensure_ascii=False), source="user"),
+                    ],
+                    json_output=True,
+                )
+            try:
+                categories = json_loads(result.content)
+            except (TypeError, ValueError):
+                # Should not happen in JSON mode; keep the lenient parser as a safety net
+                categories = extract_json_from_text(str(result.content))
+            if not isinstance(categories, dict):
+                return {}
+            return {desc: cat for desc, cat in categories.items() if desc in batch}
+
+        batches = [misses[i:i + CATEGORIZE_BATCH_SIZE] for i in range(0, len(misses), CATEGORIZE_BATCH_SIZE)]
+        for categories in await asyncio.gather(*(classify(batch) for batch in batches)):
+            _CATEGORY_CACHE.update(categories)
+        save_category_cache(_CATEGORY_CACHE)
+
+    for txn in transactions:
+        txn["category"] = _CATEGORY_CACHE.get(normalize_description(txn.get("description", "")), "Uncategorized")
+    return parsed_json
+
+# === Shared model clients ===
+# One pooled HTTP/2 connection set for the whole process, shared by every
+# model client, so each agent turn and categorizer call reuses warm
+# connections instead of paying a new TCP + TLS handshake.
+# The clients' connections belong to the event loop that opened them, so they
+# are only reused within the same long-lived loop, and an owner task closes
+# them on that loop before it goes away.
+_HTTP_CLIENT = None
+_MODEL_CLIENTS = {}
+_CLIENT_LOOP = None
+_CLIENT_OWNER = None
+
+async def _own_clients(http_client, model_clients: dict) -> None:
+    """
+    Keeps the shared clients open until cancelled, then closes them.
+
+    asyncio.run() cancels leftover tasks before it closes its loop, so the
+    clients are closed on the loop that owns their connections instead of
+    being dropped with open connection pools.
+    """
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for model_client in list(model_clients.values()):
+            await model_client.close()
+        model_clients.clear()
+        await http_client.aclose()
+
+def get_model_client(model: str = OPENAI_MODEL) -> OpenAIChatCompletionClient:
+    global _HTTP_CLIENT, _MODEL_CLIENTS, _CLIENT_LOOP, _CLIENT_OWNER
+    loop = asyncio.get_running_loop()
+    if _CLIENT_LOOP is not loop:
+        # The previous loop's owner task closes (or already closed) its
+        # clients; make sure it gets cancelled if that loop is still alive.
+        if _CLIENT_OWNER is not None and _CLIENT_LOOP is not None and not _CLIENT_LOOP.is_closed():
+            _CLIENT_LOOP.call_soon_threadsafe(_CLIENT_OWNER.cancel)
+        _HTTP_CLIENT = None
+        _MODEL_CLIENTS = {}
+        _CLIENT_OWNER = None
+        _CLIENT_LOOP = loop
+    if _HTTP_CLIENT is None:
+        _HTTP_CLIENT = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+            timeout=httpx.Timeout(600.0, connect=10.0),
+        )
+        _CLIENT_OWNER = loop.create_task(_own_clients(_HTTP_CLIENT, _MODEL_CLIENTS))
+    if model not in _MODEL_CLIENTS:
+        _MODEL_CLIENTS[model] = OpenAIChatCompletionClient(
+            model=model, api_key=OPENAI_API_KEY, http_client=_HTTP_CLIENT
+        )
+    return _MODEL_CLIENTS[model]
+
+async def close_model_client() -> None:
+    """Closes the shared clients; call once on shutdown, not after every run."""
+    global _HTTP_CLIENT, _MODEL_CLIENTS, _CLIENT_OWNER
+    owner = _CLIENT_OWNER
+    _HTTP_CLIENT, _MODEL_CLIENTS, _CLIENT_OWNER = None, {}, None
+    if owner is not None:
+        # Let a just-created owner start first: a task cancelled before its
+        # first step never runs its finally block.
+        await asyncio.sleep(0)
+        owner.cancel()
+        await asyncio.gather(owner, return_exceptions=True)
+
+# === Warm code executors ===
+# Starting a Docker container costs seconds, so the executor is started once
+# and reused by every run instead of being started and stopped per statement.
+_CODE_EXECUTOR = None
+
+async def get_code_executor() -> DockerCommandLineCodeExecutor:
+    global _CODE_EXECUTOR
+    if _CODE_EXECUTOR is None:
+        _CODE_EXECUTOR = DockerCommandLineCodeExecutor(work_dir="temp")
+        await _CODE_EXECUTOR.start()
+    return _CODE_EXECUTOR
+
+async def close_code_executor() -> None:
+    global _CODE_EXECUTOR
+    if _CODE_EXECUTOR is not None:
+        await _CODE_EXECUTOR.stop()
+        _CODE_EXECUTOR = None
+
+@asynccontextmanager
+async def executor_pool(size: int):
+    """
+    Starts `size` executors up front and yields a queue of idle ones.
+
+    Take an executor with `await pool.get()` and hand it back with
+    `pool.put_nowait(executor)`; all of them are stopped on exit.
+    """
+    executors = [DockerCommandLineCodeExecutor(work_dir="temp") for _ in range(size)]
+    await asyncio.gather(*(executor.start() for executor in executors))
+    pool = asyncio.Queue()
+    for executor in executors:
+        pool.put_nowait(executor)
+    try:
+        yield pool
+    finally:
+        await asyncio.gather(*(executor.stop() for executor in executors))
+
+async def run_parsing_agent(file_path: str = BANK_STATEMENT_FILE,
+                            code_executor: DockerCommandLineCodeExecutor = None):
+    statement_text = load_statement(file_path)
+
+    model_client = get_model_client()
+    # Six-label classification does not need the parsing model
+    categorizer_model_client = get_model_client(CATEGORIZER_MODEL)
 
     # Assistant agent: writes code to parse the statement
     assistant = AssistantAgent(
         name="assistant",
         model_client=model_client,
         system_message=(
-            "You are a Python developer assistant. You will receive a raw bank "
-            "statement text stored in a variable named `statement_text`. Write a single "
-            "```python``` code block that:\n"
-            "1. Parses `statement_text` into a JSON object with keys:\n"
-            "   - 'transactions_by_cardholder': a dictionary where each key is a cardholder name "
-            "     and the value is a list of {sale_date, post_date, description, amount}.\n"
-            "   - 'summary': contains 'bank_name', 'total_transactions','total_amount','previous_balance','payments','credits','purchases','cash_advances','fees','interest','new_balance', rewards_balance, 'available_credit_limit'.\n"
-            "2. Ensure amounts are numbers (floats) and NOT zero.\n"
-            "3. Ensure transactions for all cardholders are captured correctly. It is very rare to have no transactions for a cardholder if there are multiple card holders.\n"
-            "4. Prints **only** the JSON via `print(json.dumps(parsed, ensure_ascii=False))`.\n"
-            "Do not output any explanation or extra text."
+            "Python developer. The task names a bank statement text file in the working directory "
+            "and previews its first lines. Reply with one ```python``` block that:\n"
+            "- loads it: statement_text = open(<file>, encoding='utf-8').read() (never paste the text)\n"
+            "- builds: {transactions_by_cardholder: {<name>: [{sale_date, post_date, description, amount: float != 0}]}, "
+            "summary: {bank_name, total_transactions, total_amount, previous_balance, payments, credits, purchases, "
+            "cash_advances, fees, interest, new_balance, rewards_balance, available_credit_limit}}\n"
+            "- captures every cardholder's transactions (a cardholder with none is rare)\n"
+            "- prints only print(json.dumps(parsed, ensure_ascii=False))\n"
+            "No explanation. Once the executor has printed the final JSON, reply only __DONE__."
         ),
         reflect_on_tool_use=True
     )
 
     # Local executor for running the code
     # code_executor = LocalCommandLineCodeExecutor(work_dir="agent_exec_workspace")
-    code_executor = DockerCommandLineCodeExecutor(work_dir="temp")
-    await code_executor.start()
+    # Reuse an already running container (from the caller's pool, or the shared one)
+    if code_executor is None:
+        code_executor = await get_code_executor()
 
     # Code execution agent
     executor_agent = CodeExecutorAgent(
@@ -68,158 +455,96 @@ async def run_parsing_agent():
         code_executor=code_executor
     )
 
-    # --- NEW: Categorizer Agent ---
-    categorizer_agent = AssistantAgent(
-        name="categorizer",
-        model_client=model_client,
-        system_message=(
-    "You are an AI financial analyst. Your purpose is to categorize financial transactions "
-    "into a few broad categories.\n\n"
-    "You will receive a JSON object that contains:\n"
-    "1. 'transactions_by_cardholder': a dictionary where each key is a cardholder name and "
-    "   the value is a list of transaction objects.\n"
-    "2. 'summary': a dictionary with account summary data.\n\n"
-    "Your job:\n"
-    "- Return the exact same JSON object structure.\n"
-    "- Do NOT remove or rename any keys.\n"
-    "- Do NOT modify the 'summary' section.\n"
-    "- Inside 'transactions_by_cardholder', for each transaction object, add a new key-value "
-    "  pair: \"category\": \"Category Name\".\n\n"
-    "CRITICAL RULES:\n"
-    "Use ONLY the 6 categories defined below.\n"
-    "For payments, refunds, and fees, use the Financial Transactions category.\n"
-    "If a description is too vague, use Uncategorized.\n\n"
-    "CATEGORY DEFINITIONS:\n"
-    "Food & Dining: All food-related spending. This includes both groceries from supermarkets "
-    "and purchases from restaurants, cafes, bars, and food delivery services.\n"
-    "Merchandise & Services: A broad category for general shopping and personal care. "
-    "This includes retail stores, online marketplaces (like Amazon), electronics, clothing, "
-    "hobbies, entertainment, streaming services (Netflix), gym memberships, and drugstores (CVS).\n"
-    "Bills & Subscriptions: Recurring charges for essential services. This primarily includes "
-    "utilities (phone, internet) and insurance payments.\n"
-    "Travel & Transportation: Costs for getting around. This includes daily transport (gas stations, "
-    "Uber, public transit) and long-distance travel (airlines, hotels, rental cars).\n"
-    "Financial Transactions: All non-spending activities that affect your balance. This includes "
-    "payments made to your account, refunds from merchants, statement credits, and any fees or interest charges.\n"
-    "Uncategorized: For any transaction that does not clearly fit into the categories above.\n"
-    ),
-        reflect_on_tool_use=False
-    )
-
-
-    # Round-robin chat between assistant and executor
+    # Round-robin chat between assistant and executor; categorization is a
+    # separate LLM call so that only unseen descriptions go to the categorizer.
     team = RoundRobinGroupChat(
-        participants=[assistant, executor_agent, categorizer_agent],
-        termination_condition=MaxMessageTermination(30)
+        participants=[assistant, executor_agent],
+        termination_condition=(
+            ExecutorJSONTermination() | DoneAfterExecutionTermination() | MaxMessageTermination(30)
+        )
     )
 
-    # Send the statement as initial task
+    # Put the statement in the executor's work dir and send only its name plus a
+    # short preview, so the full text is not repeated in every LLM turn.
+    statement_file = f"statement_{hashlib.sha256(statement_text.encode('utf-8')).hexdigest()[:12]}.txt"
+    (Path("temp") / statement_file).write_text(statement_text, encoding="utf-8")
+    preview = "\n".join(statement_text.splitlines()[:STATEMENT_PREVIEW_LINES])
     task = TextMessage(
-        content=f"statement = '''{statement_text}'''",
+        content=(
+            f"Read statement_text from the file `{statement_file}` in the working directory, "
+            "then emit JSON as specified.\n\n"
+            f"Preview of the first {STATEMENT_PREVIEW_LINES} lines (layout only, not the full statement):\n"
+            f"---\n{preview}\n---"
+        ),
         source="user"
     )
 
-    result = await Console(team.run_stream(task=task))
-    # result = await team.run(task=task)
-    # result = team.run_stream(task=task)
-    # async for message in result:
-    #     print(message)
-
-    # Stop executor safely
-    await code_executor.stop()
-
-        # ----------------------------
-    # Robust JSON extraction logic
-    # ----------------------------
-      # make sure this import is available (or add at top of file)
+    # A statement with a layout we have parsed before replays the cached
+    # parser script and skips the assistant entirely.
+    fingerprint = f"cardholder_json:{text_fingerprint(statement_text)}"
+    parsed_json = await replay_parser_script(fingerprint, statement_file, code_executor)
+    if parsed_json is not None:
+        return await categorize_transactions(parsed_json, categorizer_model_client)
+
+    # Start categorizing the moment the executor prints parseable JSON, so the
+    # categorizer call overlaps any turns the team still runs.
+    result = None
+    categorize_task = None
+    last_code = None
+    async for message in team.run_stream(task=task):
+        if isinstance(message, TaskResult):
+            result = message
+            continue
+        src = getattr(message, "source", "")
+        print(f"---------- {type(message).__name__} ({src}) ----------")
+        print(getattr(message, "content", ""))
 
-    def extract_json_from_text(text: str):
-        """Return parsed JSON object found in text or None."""
-        if not text or not isinstance(text, str):
-            return None
+        if src == "assistant" and isinstance(getattr(message, "content", None), str):
+            last_code = extract_python_code(message.content) or last_code
 
-        # strip common code fences
-        text2 = re.sub(r"```(?:json|python)?", "", text, flags=re.IGNORECASE)
+        # 1) prefer executor messages (they are expected to print JSON)
+        if categorize_task is None and src == "executor":
+            parsed_json = extract_json_from_text(str(getattr(message, "content", "")))
+            if parsed_json is not None:
+                # Remember the script for this layout if it read the statement file
+                if last_code and statement_file in last_code:
+                    store_script(fingerprint, last_code, statement_file)
+                categorize_task = asyncio.create_task(categorize_transactions(parsed_json, categorizer_model_client))
 
-        # Try quick parse if text is (mostly) JSON
-        stripped = text2.strip()
-        if stripped.startswith("{") and stripped.endswith("}"):
-            try:
-                return json.loads(stripped)
-            except Exception:
-                pass
-
-        # Find first balanced {...} substring and try parsing progressively
-        start = text2.find("{")
-        while start != -1:
-            depth = 0
-            for i in range(start, len(text2)):
-                ch = text2[i]
-                if ch == "{":
-                    depth += 1
-                elif ch == "}":
-                    depth -= 1
-                    if depth == 0:
-                        candidate = text2[start:i+1]
-                        # try parse
-                        try:
-                            return json.loads(candidate)
-                        except Exception:
-                            # parsing failed; continue searching for next '{'
-                            break
-            start = text2.find("{", start + 1)
-        return None
+    if categorize_task is not None:
+        return await categorize_task
 
-    # Search all messages for JSON (executor first, then assistant, then any)
+    # Search all messages for JSON (executor output was checked while streaming)
     parsed_json = None
 
-    # 1) prefer executor messages (they are expected to print JSON)
+    # 2) fallback: index messages by source once, then check assistant first
+    #    and any other source after it
+    by_src = {}
     for msg in result.messages:
-        src = getattr(msg, "source", "")
-        content = getattr(msg, "content", None)
-        # normalize content to string for searching
-        try:
-            content_str = content if isinstance(content, str) else str(content)
-        except Exception:
-            content_str = None
+        by_src.setdefault(getattr(msg, "source", ""), []).append(msg)
+    by_src.pop("executor", None)
+    priority = ["assistant"] + [src for src in by_src if src != "assistant"]
 
-        if not content_str:
-            continue
-
-        # direct JSON candidate in executor output or fenced block
-        if src == "categorizer":
-            parsed_json = extract_json_from_text(content_str)
-            if parsed_json is not None:
-                return parsed_json
-
-        elif src == "executor":
-            parsed_json = extract_json_from_text(content_str)
-            if parsed_json is not None:
-                return parsed_json
-
-    # 2) fallback: check assistant / all messages
-    for msg in result.messages:
+    for msg in (msg for src in priority for msg in by_src.get(src, [])):
         content = getattr(msg, "content", None)
-        try:
-            content_str = content if isinstance(content, str) else str(content)
-        except Exception:
-            content_str = None
+        if isinstance(content, str):
+            content_str = content
+        elif content is None:
+            continue
+        else:
+            content_str = str(content)
         if not content_str:
             continue
         parsed_json = extract_json_from_text(content_str)
         if parsed_json is not None:
-            return parsed_json
+            return await categorize_transactions(parsed_json, categorizer_model_client)
 
     # 3) If still not found — print helpful debug info and return empty dict
     print("\n[DEBUG] No JSON detected. Conversation summary (truncated):")
     for idx, msg in enumerate(result.messages):
         src = getattr(msg, "source", "<no-source>")
         content = getattr(msg, "content", "")
-        # attempt safe string conversion
-        try:
-            preview = (content if isinstance(content, str) else str(content))[:800]
-        except Exception:
-            preview = "<could not stringify content>"
+        preview = (content if isinstance(content, str) else str(content))[:800]
         print(f"Message[{idx}] source={src} preview={preview!r}\n{'-'*40}")
 
     # Return empty dict instead of raising, so caller can handle fallback
@@ -236,14 +561,55 @@ async def run_parsing_agent():
 
     # raise ValueError("No JSON output detected from executor.")
 
+async def process_statement(file_path: str) -> dict:
+    """
+    Parses one statement using the shared model clients and executor.
+
+    For long-running callers (e.g. a web app) that await this repeatedly on one
+    event loop: clients, connections and the container stay warm between
+    statements. Call close_code_executor() and close_model_client() on shutdown.
+    """
+    return await run_parsing_agent(file_path)
+
+async def main(file_paths: list = None) -> dict:
+    """
+    Parses several statements concurrently; returns {file_path: parsed_json}.
+    A failed statement's value is the exception it raised, so one failure
+    doesn't discard the statements that did parse.
+    """
+    file_paths = file_paths or [BANK_STATEMENT_FILE]
+    max_parallel = min(int(os.getenv("MAX_PARALLEL", "8")), len(file_paths))
+    try:
+        # The pool doubles as the concurrency limit: a statement only starts
+        # once it has an idle executor.
+        async with executor_pool(max_parallel) as pool:
+            async def parse_one(file_path: str) -> dict:
+                code_executor = await pool.get()
+                try:
+                    return await run_parsing_agent(file_path, code_executor)
+                finally:
+                    pool.put_nowait(code_executor)
+
+            results = await asyncio.gather(*(parse_one(file_path) for file_path in file_paths),
+                                           return_exceptions=True)
+        return dict(zip(file_paths, results))
+    finally:
+        await close_code_executor()
+        await close_model_client()
+
 if __name__ == "__main__":
-    parsed_data = asyncio.run(run_parsing_agent())
-    print("\n=== Parsed JSON Object ===")
-    print(json.dumps(parsed_data, indent=2, ensure_ascii=False))
-
-    # Save the JSON to a file
-    output_filename = "parsed_data.json"
-    with open(output_filename, "w", encoding="utf-8") as f:
-        json.dump(parsed_data, f, indent=2, ensure_ascii=False)
-    
-    print(f"\nJSON data saved to {output_filename}")
\ No newline at end of file
+    results = asyncio.run(main(sys.argv[1:]))
+    for file_path, parsed_data in results.items():
+        if isinstance(parsed_data, BaseException):
+            print(f"\n[ERROR] {file_path}: {parsed_data}")
+            continue
+        print(f"\n=== Parsed JSON Object ({file_path}) ===")
+        output = json_dumps(parsed_data, indent=True)
+        print(output)
+
+        # Save the JSON to a file
+        output_filename = "parsed_data.json" if len(results) == 1 else f"{Path(file_path).stem}_parsed.json"
+        with open(output_filename, "w", encoding="utf-8") as f:
+            f.write(output)
+
+        print(f"\nJSON data saved to {output_filename}")
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import os
+import sys
 import asyncio
 import json
 import re
@@ -9,17 +10,48 @@ from autogen_agentchat.agents import AssistantAgent, CodeExecutorAgent
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.conditions import MaxMessageTermination
 from autogen_agentchat.messages import TextMessage
+from autogen_core import CancellationToken
+from anthropic import AsyncAnthropic, RateLimitError
 from autogen_ext.code_executors.local import LocalCommandLineCodeExecutor
 from autogen_ext.code_executors.docker import DockerCommandLineCodeExecutor
 from autogen_agentchat.ui import Console
 from dotenv import load_dotenv
+from pathlib import Path
 
 load_dotenv()
 
+# orjson is a much faster drop-in for the JSON we parse and save; fall back to
+# the stdlib when it is not installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_loads(text: str):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+def json_dumps(obj, indent: bool = False) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
 # === CONFIGURATION ===
 BANK_STATEMENT_FILE = "temp/statement.txt"  # Text file containing raw statement
 ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "claude-sonnet-4-20250514")  # Default model
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")  # Must be set in your .env
+VERBOSE = os.getenv("VERBOSE", "1") != "0"  # Stream the Stage 1 transcript to the console
+PARSER_MAX_MESSAGES = 8  # Stage 1 message cap (task messages included)
+CATEGORIZER_ATTEMPTS = 3  # Categorizer attempts; the first verified result wins
+CATEGORIZER_HEDGE_SECONDS = 60  # Start a backup attempt if the current one has not answered by then
+CATEGORY_CACHE_FILE = "categorizer_cache.json"  # Persisted description -> category map
+CATEGORIZE_CHUNK_SIZE = 25  # Distinct descriptions per categorizer request
+MAX_PARALLEL_CATEGORIZE = 10  # Upper bound on concurrent categorizer calls
+# Requests per minute allowed by your account; calls are paced to 80% of it when set
+CATEGORIZER_RPM = int(os.getenv("CATEGORIZER_RPM", "0")) or None
+CATEGORIZER_MAX_TOKENS = 4096  # Output budget for one batched categorizer request
+BATCH_POLL_SECONDS = 30  # How often to check whether a message batch has finished
 # OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")  # Default model
 # OPENAI_API_KEY = os.getenv("OPENAI_API_KEY2")  # Must be set in your .env
 
@@ -29,108 +61,186 @@ if not ANTHROPIC_API_KEY:
 
 # === Helper to read statement text ===
 def load_statement(file_path: str) -> str:
-    with open(file_path, "r", encoding="utf-8") as f:
-        return f.read()
+    return Path(file_path).read_text(encoding="utf-8")
+
+# === Category cache (description key -> category) ===
+# Merchants repeat across cardholders and statements, so a description that
+# was categorized once is never sent to the categorizer LLM again.
+_DESC_NOISE_RE = re.compile(r"[\d#*]+")
+_TRAILING_STATE_RE = re.compile(r"\s+[A-Z]{2}$")
+
+def load_category_cache(file_path: str = CATEGORY_CACHE_FILE) -> dict:
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return json_loads(f.read())
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def save_category_cache(cache: dict, file_path: str = CATEGORY_CACHE_FILE) -> None:
+    # Write to a temp file and swap it in, so a crash never leaves a half-written cache
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json_dumps(cache))
+    os.replace(tmp_path, file_path)
+
+_CATEGORY_CACHE = load_category_cache()
 
 # ----------------------------
 # Robust JSON extraction logic (MOVED UP)
 # ----------------------------
+_FENCE_RE = re.compile(r"```(?:json|python)?", re.IGNORECASE)
+_JSON_DECODER = json.JSONDecoder()
+
+def find_json_objects(text: str):
+    """
+    Yields every JSON object embedded in text, in order.
+
+    Each '{' is handed to the C-level JSONDecoder.raw_decode, which either
+    returns the object and where it ends or fails fast, instead of walking
+    the text character by character in Python. (orjson has no raw_decode, so
+    this stays on the stdlib decoder.)
+    """
+    i = text.find("{")
+    while i != -1:
+        try:
+            obj, end = _JSON_DECODER.raw_decode(text, i)
+        except json.JSONDecodeError:
+            i = text.find("{", i + 1)
+            continue
+        yield obj
+        i = text.find("{", end)
+
 def extract_json_from_text(text: str):
     """Return parsed JSON object found in text or None."""
     if not text or not isinstance(text, str):
         return None
 
-    # strip common code fences
-    text2 = re.sub(r"```(?:json|python)?", "", text, flags=re.IGNORECASE)
-
-    # Try quick parse if text is (mostly) JSON
-    stripped = text2.strip()
+    # The script's print(json.dumps(...)) is the last line of executor output,
+    # so try that line alone first; pip chatter or warnings above it don't
+    # need to be parsed
+    last_line = text.rstrip().rpartition("\n")[2]
+    parsed = _parse_whole(last_line)
+    if parsed is not None:
+        return parsed
+
+    # Otherwise try the text as-is (e.g. pretty-printed JSON) before any
+    # regex or scanning
+    if len(last_line) < len(text.strip()):
+        parsed = _parse_whole(text)
+        if parsed is not None:
+            return parsed
+
+    # strip common code fences (only when there are any) and retry
+    text2 = text
+    if "```" in text:
+        text2 = _FENCE_RE.sub("", text)
+        parsed = _parse_whole(text2)
+        if parsed is not None:
+            return parsed
+
+    # Otherwise take the first embedded object that parses
+    return next(find_json_objects(text2), None)
+
+def _parse_whole(text: str):
+    """Parses text that is (mostly) one JSON object, else returns None."""
+    stripped = text.strip()
     if stripped.startswith("{") and stripped.endswith("}"):
         try:
-            return json.loads(stripped)
+            return json_loads(stripped)
         except Exception:
             pass
-
-    # Find first balanced {...} substring and try parsing progressively
-    start = text2.find("{")
-    while start != -1:
-        depth = 0
-        for i in range(start, len(text2)):
-            ch = text2[i]
-            if ch == "{":
-                depth += 1
-            elif ch == "}":
-                depth -= 1
-                if depth == 0:
-                    candidate = text2[start:i+1]
-                    # try parse
-                    try:
-                        return json.loads(candidate)
-                    except Exception:
-                        # parsing failed; continue searching for next '{'
-                        break
-        start = text2.find("{", start + 1)
     return None
 
-async def run_parsing_agent():
-    statement_text = load_statement(BANK_STATEMENT_FILE)
-
-    # Create the model client correctly
-    # model_client = OpenAIChatCompletionClient(
-    #     model=OPENAI_MODEL, api_key=OPENAI_API_KEY
-    # )
-    model_client = AnthropicChatCompletionClient(
-        model=ANTHROPIC_MODEL, api_key=ANTHROPIC_API_KEY)
-
-    # Assistant agent: writes code to parse the statement
-    assistant = AssistantAgent(
-        name="assistant",
-        model_client=model_client,
-        system_message=(
-            "You are a Python developer assistant. You will receive a raw bank "
-            "statement text stored in a variable named `statement_text`. Write a single "
-            "```python``` code block that:\n"
-            "1. Parses `statement_text` into a JSON object with keys:\n"
-            "   - 'transactions_by_cardholder': a dictionary where each key is a cardholder name "
-            "     and the value is a list of {sale_date, post_date, description, amount}.\n"
-            "   - 'summary': contains 'bank_name', 'total_transactions','total_amount','previous_balance','payments','credits','purchases','cash_advances','fees','interest','new_balance', rewards_balance, 'available_credit_limit'.\n"
-            "2. Ensure amounts are numbers (floats) and NOT zero.\n"
-            "3. Ensure transactions for all cardholders are captured correctly. It is very rare to have no transactions for a cardholder if there are multiple card holders.\n"
-            "4. Prints **only** the JSON via `print(json.dumps(parsed, ensure_ascii=False))`.\n"
-            "5. IMPORTANT: The variable `statement_text` is already defined - just use it directly.\n"
-            "Do not output any explanation or extra text."
-        ),
-        reflect_on_tool_use=True
-    )
-
-    # Local executor for running the code
-    # code_executor = LocalCommandLineCodeExecutor(work_dir="agent_exec_workspace")
-    code_executor = DockerCommandLineCodeExecutor(work_dir="temp")
-    await code_executor.start()
-
-    # Code execution agent
-    executor_agent = CodeExecutorAgent(
-        name="executor",
-        code_executor=code_executor
-    )
+# ----------------------------
+# Rate-limit aware concurrency
+# ----------------------------
+class AdaptiveLimiter:
+    """
+    Concurrency limit for model calls that adapts to rate limiting.
+
+    The limit grows by one after every successful call and halves on a
+    RateLimitError (which is then retried after a backoff), so a large fan-out
+    settles just below the provider's limits instead of hammering them. With
+    `requests_per_minute` set, call starts are also spaced to stay under 80%
+    of that rate.
+    """
+
+    def __init__(self, max_concurrency: int, min_concurrency: int = 1,
+                 requests_per_minute: int = None, max_overload_retries: int = 5):
+        self.limit = max_concurrency
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_overload_retries = max_overload_retries
+        self._interval = 60.0 / (requests_per_minute * 0.8) if requests_per_minute else 0.0
+        self._next_start = 0.0
+        self._active = 0
+        self._condition = asyncio.Condition()
+
+    async def _acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+            now = asyncio.get_running_loop().time()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self._interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _release(self, overloaded: bool = None) -> None:
+        async with self._condition:
+            self._active -= 1
+            if overloaded:
+                self.limit = max(self.min_concurrency, self.limit // 2)
+            elif overloaded is not None:
+                self.limit = min(self.max_concurrency, self.limit + 1)
+            self._condition.notify_all()
+
+    async def run(self, call):
+        """Awaits `call()` within the limit, retrying it on rate-limit errors."""
+        for retry in range(self.max_overload_retries + 1):
+            await self._acquire()
+            try:
+                result = await call()
+            except RateLimitError:
+                await self._release(overloaded=True)
+                if retry == self.max_overload_retries:
+                    raise
+                await asyncio.sleep(min(2 ** retry, 30))
+                continue
+            except BaseException:
+                # Other failures say nothing about load
+                await self._release()
+                raise
+            await self._release(overloaded=False)
+            return result
 
-    # --- Categorizer Agent ---
-    categorizer_agent = AssistantAgent(
-        name="categorizer",
-        model_client=model_client,
-        system_message=(
+# ----------------------------
+# Agent prompts (built once at import)
+# ----------------------------
+ASSISTANT_SYSTEM_MESSAGE = (
+    "You are a Python developer assistant. You will receive a raw bank "
+    "statement and the name of the file it is saved in. Write a single "
+    "```python``` code block that:\n"
+    "1. Parses `statement_text` into a JSON object with keys:\n"
+    "   - 'transactions_by_cardholder': a dictionary where each key is a cardholder name "
+    "     and the value is a list of {sale_date, post_date, description, amount}.\n"
+    "   - 'summary': contains 'bank_name', 'total_transactions','total_amount','previous_balance','payments','credits','purchases','cash_advances','fees','interest','new_balance', rewards_balance, 'available_credit_limit'.\n"
+    "2. Ensure amounts are numbers (floats) and NOT zero.\n"
+    "3. Ensure transactions for all cardholders are captured correctly. It is very rare to have no transactions for a cardholder if there are multiple card holders.\n"
+    "4. Prints **only** the JSON via `print(json.dumps(parsed, ensure_ascii=False))`.\n"
+    "5. IMPORTANT: Load it with `statement_text = open(<file>, encoding='utf-8').read()` - never paste the statement into the code.\n"
+    "Do not output any explanation or extra text."
+)
+
+CATEGORIZER_SYSTEM_MESSAGE = (
     "You are an AI financial analyst. Your purpose is to categorize financial transactions "
     "into a few broad categories.\n\n"
-    "You will receive a JSON object that contains:\n"
-    "1. 'transactions_by_cardholder': a dictionary where each key is a cardholder name and "
-    "   the value is a list of transaction objects.\n"
-    "2. 'summary': a dictionary with account summary data.\n\n"
+    "You will receive a JSON array of transactions, each with a numeric 'tid', a "
+    "'description' and an 'amount'.\n\n"
     "Your job:\n"
-    "- Return the exact same JSON object structure.\n"
-    "- Do NOT remove or rename any keys.\n"
-    "- Do NOT modify the 'summary' section.\n"
-    "- Inside 'transactions_by_cardholder', for each transaction object, add a new key-value "
-    "  pair: \"category\": \"Category Name\".\n\n"
+    "- Return ONLY {\"categories\": [{\"tid\": <tid>, \"category\": \"Category Name\"}, ...]}\n"
+    "- Include exactly one entry for every tid you received.\n"
+    "- Do NOT repeat descriptions, amounts or any other transaction data.\n\n"
     "CRITICAL RULES:\n"
     "Use ONLY the 6 categories defined below.\n"
     "For payments, refunds, and fees, use the Financial Transactions category.\n"
@@ -148,25 +258,323 @@ async def run_parsing_agent():
     "Financial Transactions: All non-spending activities that affect your balance. This includes "
     "payments made to your account, refunds from merchants, statement credits, and any fees or interest charges.\n"
     "Uncategorized: For any transaction that does not clearly fit into the categories above.\n"
-    "Output ONLY the JSON with categories added. Do not include any explanations or markdown formatting."
-    ),
+    "Output ONLY the JSON. Do not include any explanations or markdown formatting."
+)
+
+CATEGORIZER_TASK_TEMPLATE = "Categorize these transactions:\n{transactions}"
+
+def make_categorizer_agent(model_client) -> AssistantAgent:
+    """A fresh categorizer; concurrent attempts can't share one agent's history."""
+    return AssistantAgent(
+        name="categorizer",
+        model_client=model_client,
+        system_message=CATEGORIZER_SYSTEM_MESSAGE,
         reflect_on_tool_use=False
     )
 
+def verify_categorized_json(json_data, items) -> bool:
+    """Check the categorizer returned a category for every tid it was sent."""
+    if not isinstance(json_data, dict):
+        return False
+    categories = json_data.get("categories")
+    # Cheapest failures first: no list at all, or too few entries to cover
+    # every tid, are rejected before any set is built
+    if not isinstance(categories, list) or len(categories) < len(items):
+        return False
+    returned = {
+        entry.get("tid") for entry in categories
+        if isinstance(entry, dict) and isinstance(entry.get("category"), str)
+    }
+    return returned.issuperset(item["tid"] for item in items)
+
+async def run_categorizer_with_retry(model_client, items, max_retries: int = CATEGORIZER_ATTEMPTS,
+                                     max_concurrency: int = None, limiter: "AdaptiveLimiter" = None,
+                                     hedge_seconds: float = CATEGORIZER_HEDGE_SECONDS):
+    """
+    Categorizes `items` ({tid, description, amount} dicts) and returns a
+    {tid: category} dict, trying up to `max_retries` times.
+
+    One attempt is started; the next is started only when an attempt fails
+    verify_categorized_json or errors, or when none has answered within
+    `hedge_seconds` (a hedge, so a stuck request does not cost a whole
+    timeout). At most `max_concurrency` attempts (default all of them) are in
+    flight, the first verified result wins and the rest are cancelled, so
+    the common case costs a single request. Returns None if every attempt
+    fails. Model calls go through `limiter` when one is given.
+    """
+    max_in_flight = max_concurrency or max_retries
+    # Serialized once for every attempt; indentation would only add tokens
+    task_content = CATEGORIZER_TASK_TEMPLATE.format(transactions=json_dumps(items))
+
+    async def attempt():
+        # A single agent answers in one turn, so it is called directly rather
+        # than through a one-member group chat.
+        async def call():
+            return await make_categorizer_agent(model_client).on_messages(
+                [TextMessage(content=task_content, source="user")], CancellationToken()
+            )
+
+        response = await (limiter.run(call) if limiter is not None else call())
+        content = getattr(response.chat_message, "content", None)
+        candidate = extract_json_from_text(content if isinstance(content, str) else str(content))
+        if not verify_categorized_json(candidate, items):
+            return None
+        return {entry["tid"]: entry["category"] for entry in candidate["categories"]
+                if isinstance(entry, dict) and "tid" in entry}
+
+    pending = {asyncio.create_task(attempt())}
+    started = 1
+    try:
+        while pending:
+            can_hedge = started < max_retries and len(pending) < max_in_flight
+            done, pending = await asyncio.wait(
+                pending, timeout=hedge_seconds if can_hedge else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            failed = 0
+            for finished in done:
+                if finished.exception() is not None:
+                    print(f"[WARN] Categorizer attempt failed: {finished.exception()}")
+                    failed += 1
+                elif finished.result() is not None:
+                    return finished.result()
+                else:
+                    failed += 1
+            # Replace each failed attempt, or hedge a slow one on timeout
+            for _ in range(failed if done else 1):
+                if started >= max_retries or len(pending) >= max_in_flight:
+                    break
+                pending.add(asyncio.create_task(attempt()))
+                started += 1
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    print(f"\n[DEBUG] No verified categories after {max_retries} attempts; leaving {len(items)} transactions uncategorized.")
+    return None
+
+def chunk_transactions(items, chunk_size: int = CATEGORIZE_CHUNK_SIZE):
+    """Yields consecutive slices of at most `chunk_size` categorizer items."""
+    for start in range(0, len(items), chunk_size):
+        yield items[start:start + chunk_size]
+
+def description_key(tx) -> str:
+    """Cache key for a transaction: normalized description plus the amount's sign."""
+    desc = _DESC_NOISE_RE.sub(" ", str(tx.get("description", "")).upper())
+    desc = _TRAILING_STATE_RE.sub("", " ".join(desc.split()))
+    try:
+        sign = "-" if float(tx.get("amount") or 0) < 0 else "+"
+    except (TypeError, ValueError):
+        sign = "?"
+    return f"{desc}|{sign}"
+
+def plan_categorization(parsed_jsons: list):
+    """
+    Copies the statements' transactions and works out what the model still
+    has to categorize.
+
+    Transactions whose description is already in the category cache get
+    their category straight away. The rest are grouped by description_key,
+    and only one {tid, description, amount} item per unseen key is sent to
+    the model. Returns (categorized, keys, groups, items): the copied
+    transactions_by_cardholder per statement, the key for each tid, the
+    copies waiting on each key, and the items to send.
+    """
+    categorized = []
+    groups = {}
+    for parsed_json in parsed_jsons:
+        # Malformed Stage 1 output (a non-list cardholder value, or items that
+        # aren't transaction dicts) is skipped rather than copied.
+        source = parsed_json.get("transactions_by_cardholder") if isinstance(parsed_json, dict) else None
+        by_cardholder = {cardholder: [dict(tx) for tx in transactions if isinstance(tx, dict)]
+                         for cardholder, transactions in (source.items() if isinstance(source, dict) else ())
+                         if isinstance(transactions, list)}
+        categorized.append(by_cardholder)
+        for tx in (tx for txs in by_cardholder.values() for tx in txs):
+            key = description_key(tx)
+            if key in _CATEGORY_CACHE:
+                tx["category"] = _CATEGORY_CACHE[key]
+            else:
+                groups.setdefault(key, []).append(tx)
+
+    keys = list(groups)
+    items = [{"tid": tid, "description": groups[key][0].get("description"), "amount": groups[key][0].get("amount")}
+             for tid, key in enumerate(keys)]
+    return categorized, keys, groups, items
+
+def apply_categories(keys, groups, categories) -> None:
+    """Writes a {tid: category} result onto every transaction sharing that tid's key, and caches it."""
+    for tid, category in (categories or {}).items():
+        if isinstance(tid, int) and 0 <= tid < len(keys):
+            _CATEGORY_CACHE[keys[tid]] = category
+            for tx in groups[keys[tid]]:
+                tx["category"] = category
+
+async def categorize_in_chunks(model_client, parsed_json):
+    """
+    Categorizes the statement in small chunks sent concurrently.
+
+    The model only sees {tid, description, amount} per distinct, uncached
+    description and answers with a category per tid, so it never re-emits
+    the statement; categories are then written onto copies of the original
+    transactions.
+    """
+    categorized, keys, groups, items = plan_categorization([parsed_json])
+
+    # Adapts the number of in-flight calls to the provider's rate limits
+    limiter = AdaptiveLimiter(MAX_PARALLEL_CATEGORIZE, requests_per_minute=CATEGORIZER_RPM)
+    chunk_results = await asyncio.gather(*(
+        run_categorizer_with_retry(model_client, chunk, limiter=limiter)
+        for chunk in chunk_transactions(items)
+    ))
+
+    for categories in chunk_results:
+        apply_categories(keys, groups, categories)
+    if items:
+        save_category_cache(_CATEGORY_CACHE)
+    return {**parsed_json, "transactions_by_cardholder": categorized[0]}
+
+async def run_categorizer_batch(parsed_jsons: list) -> list:
+    """
+    Categorizes several parsed statements through the Anthropic Message
+    Batches API: half the price of interactive calls and a separate rate
+    limit pool, but results can take minutes (up to 24h). Meant for offline
+    runs over many statements; chunks whose reply doesn't verify are left
+    uncategorized.
+    """
+    client = AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
+    # Descriptions shared between statements are only sent once
+    categorized, keys, groups, items = plan_categorization(parsed_jsons)
+    requests = []
+    chunks_by_id = {}
+    for chunk_idx, chunk in enumerate(chunk_transactions(items)):
+        custom_id = f"chunk-{chunk_idx}"
+        chunks_by_id[custom_id] = chunk
+        requests.append({
+            "custom_id": custom_id,
+            "params": {
+                "model": ANTHROPIC_MODEL,
+                "max_tokens": CATEGORIZER_MAX_TOKENS,
+                "system": CATEGORIZER_SYSTEM_MESSAGE,
+                "messages": [{"role": "user", "content": CATEGORIZER_TASK_TEMPLATE.format(transactions=json_dumps(chunk))}],
+            },
+        })
+
+    if requests:
+        batch = await client.messages.batches.create(requests=requests)
+        print(f"Stage 2: Submitted message batch {batch.id} with {len(requests)} requests...")
+        while batch.processing_status != "ended":
+            await asyncio.sleep(BATCH_POLL_SECONDS)
+            batch = await client.messages.batches.retrieve(batch.id)
+
+        async for entry in await client.messages.batches.results(batch.id):
+            chunk = chunks_by_id[entry.custom_id]
+            if entry.result.type != "succeeded":
+                print(f"[WARN] {entry.custom_id}: {entry.result.type}, leaving chunk uncategorized")
+                continue
+            text = "".join(block.text for block in entry.result.message.content if block.type == "text")
+            candidate = extract_json_from_text(text)
+            if verify_categorized_json(candidate, chunk):
+                apply_categories(keys, groups, {
+                    item["tid"]: item["category"] for item in candidate["categories"]
+                    if isinstance(item, dict) and "tid" in item
+                })
+        save_category_cache(_CATEGORY_CACHE)
+
+    return [{**parsed_json, "transactions_by_cardholder": by_cardholder}
+            for parsed_json, by_cardholder in zip(parsed_jsons, categorized)]
+
+# ----------------------------
+# Shared model client and code executor
+# ----------------------------
+# Both are created once and reused by every run: starting a Docker container
+# costs seconds, and a long-lived client keeps its HTTP connections alive.
+_MODEL_CLIENT = None
+_CODE_EXECUTOR = None
+
+def get_model_client():
+    global _MODEL_CLIENT
+    if _MODEL_CLIENT is None:
+        # _MODEL_CLIENT = OpenAIChatCompletionClient(
+        #     model=OPENAI_MODEL, api_key=OPENAI_API_KEY
+        # )
+        _MODEL_CLIENT = AnthropicChatCompletionClient(
+            model=ANTHROPIC_MODEL, api_key=ANTHROPIC_API_KEY)
+    return _MODEL_CLIENT
+
+async def get_code_executor() -> DockerCommandLineCodeExecutor:
+    global _CODE_EXECUTOR
+    if _CODE_EXECUTOR is None:
+        # Local executor for running the code
+        # _CODE_EXECUTOR = LocalCommandLineCodeExecutor(work_dir="agent_exec_workspace")
+        _CODE_EXECUTOR = DockerCommandLineCodeExecutor(work_dir="temp")
+        await _CODE_EXECUTOR.start()
+    return _CODE_EXECUTOR
+
+async def close_shared_resources() -> None:
+    """Stops the executor and closes the model client; call once on shutdown."""
+    global _MODEL_CLIENT, _CODE_EXECUTOR
+    if _CODE_EXECUTOR is not None:
+        await _CODE_EXECUTOR.stop()
+        _CODE_EXECUTOR = None
+    if _MODEL_CLIENT is not None:
+        await _MODEL_CLIENT.close()
+        _MODEL_CLIENT = None
+
+async def run_parsing_agent(file_path: str = BANK_STATEMENT_FILE, categorize: bool = True):
+    """Parses one statement; with categorize=False the Stage 1 JSON is returned as-is."""
+    statement_text = load_statement(file_path)
+
+    model_client = get_model_client()
+
+    # Assistant agent: writes code to parse the statement
+    assistant = AssistantAgent(
+        name="assistant",
+        model_client=model_client,
+        system_message=ASSISTANT_SYSTEM_MESSAGE,
+        # No tools, so there is nothing to reflect on
+        reflect_on_tool_use=False
+    )
+
+    code_executor = await get_code_executor()
+
+    # Code execution agent
+    executor_agent = CodeExecutorAgent(
+        name="executor",
+        code_executor=code_executor
+    )
+
     # STAGE 1: Assistant + Executor to parse the statement
+    # Parsing normally succeeds within two code/run rounds; the limit (two
+    # task messages plus three rounds) caps the token spend when it doesn't.
     parsing_team = RoundRobinGroupChat(
         participants=[assistant, executor_agent],
-        termination_condition=MaxMessageTermination(15)
+        termination_condition=MaxMessageTermination(PARSER_MAX_MESSAGES)
     )
 
-    # Send the statement as initial task
-    task = TextMessage(
-        content=f"statement_text = '''{statement_text}'''",
-        source="user"
-    )
+    # The statement goes into the executor's work dir (mounted as its cwd) so
+    # the generated code reads it from disk instead of embedding it in a
+    # string literal, which also broke on triple quotes in the text.
+    statement_file = f"{Path(file_path).stem}.statement.txt"
+    (Path("temp") / statement_file).write_text(statement_text, encoding="utf-8")
+
+    # Send the instruction and the raw statement as separate task messages
+    task = [
+        TextMessage(
+            content=f"The statement below is saved as `{statement_file}` in the working directory.",
+            source="user"
+        ),
+        TextMessage(content=statement_text, source="user"),
+    ]
 
     print("Stage 1: Parsing statement...")
-    parsing_result = await Console(parsing_team.run_stream(task=task))
+    # Console renders every message as it streams; skip that work when the
+    # transcript isn't wanted
+    if VERBOSE:
+        parsing_result = await Console(parsing_team.run_stream(task=task))
+    else:
+        parsing_result = await parsing_team.run(task=task)
 
     # Extract JSON from parsing stage
     parsed_json = None
@@ -181,81 +589,40 @@ async def run_parsing_agent():
         raise ValueError("Failed to parse statement in Stage 1")
 
     print("Stage 1 completed successfully. JSON extracted.")
+    if not categorize:
+        return parsed_json
 
     # STAGE 2: Categorizer processes the parsed JSON
-    categorizer_task = TextMessage(
-        content=f"Here is the parsed JSON to categorize:\n```json\n{json.dumps(parsed_json, indent=2)}\n```",
-        source="user"
-    )
-
-    categorizer_team = RoundRobinGroupChat(
-        participants=[categorizer_agent],
-        termination_condition=MaxMessageTermination(2)
-    )
-
     print("Stage 2: Categorizing transactions...")
-    categorization_result = await Console(categorizer_team.run_stream(task=categorizer_task))
-
-    # Stop executor safely
-    await code_executor.stop()
-
-    # Search categorization result for final JSON
-    final_parsed_json = None
-
-    # 1) prefer categorizer messages
-    for msg in categorization_result.messages:
-        src = getattr(msg, "source", "")
-        content = getattr(msg, "content", None)
-        # normalize content to string for searching
-        try:
-            content_str = content if isinstance(content, str) else str(content)
-        except Exception:
-            content_str = None
-
-        if not content_str:
-            continue
-
-        if src == "categorizer":
-            final_parsed_json = extract_json_from_text(content_str)
-            if final_parsed_json is not None:
-                return final_parsed_json
-
-    # 2) fallback: check all messages in categorization result
-    for msg in categorization_result.messages:
-        content = getattr(msg, "content", None)
-        try:
-            content_str = content if isinstance(content, str) else str(content)
-        except Exception:
-            content_str = None
-        if not content_str:
-            continue
-        final_parsed_json = extract_json_from_text(content_str)
-        if final_parsed_json is not None:
-            return final_parsed_json
-
-    # 3) If still not found — print helpful debug info and return the parsed JSON from stage 1
-    print("\n[DEBUG] No categorized JSON detected. Using Stage 1 result:")
-    for idx, msg in enumerate(categorization_result.messages):
-        src = getattr(msg, "source", "<no-source>")
-        content = getattr(msg, "content", "")
-        try:
-            preview = (content if isinstance(content, str) else str(content))[:800]
-        except Exception:
-            preview = "<could not stringify content>"
-        print(f"Message[{idx}] source={src} preview={preview!r}\n{'-'*40}")
-
-    # Return the original parsed JSON from stage 1 as fallback
-    return parsed_json
-
+    return await categorize_in_chunks(model_client, parsed_json)
+
+
+async def main(file_paths: list, batch: bool = False) -> list:
+    """
+    Parses each statement in turn. With `batch`, categorization for all of
+    them is deferred to a single message batch instead of interactive calls.
+    """
+    try:
+        if not batch:
+            return [await run_parsing_agent(file_path) for file_path in file_paths]
+        parsed_jsons = [await run_parsing_agent(file_path, categorize=False) for file_path in file_paths]
+        return await run_categorizer_batch(parsed_jsons)
+    finally:
+        await close_shared_resources()
 
 if __name__ == "__main__":
-    parsed_data = asyncio.run(run_parsing_agent())
-    print("\n=== Final Parsed JSON Object ===")
-    print(json.dumps(parsed_data, indent=2, ensure_ascii=False))
-
-    # Save the JSON to a file
-    output_filename = "parsed_data.json"
-    with open(output_filename, "w", encoding="utf-8") as f:
-        json.dump(parsed_data, f, indent=2, ensure_ascii=False)
-    
-    print(f"\nJSON data saved to {output_filename}")
\ No newline at end of file
+    args = sys.argv[1:]
+    batch = "--batch" in args
+    file_paths = [arg for arg in args if arg != "--batch"] or [BANK_STATEMENT_FILE]
+    results = asyncio.run(main(file_paths, batch=batch))
+    for file_path, parsed_data in zip(file_paths, results):
+        print(f"\n=== Final Parsed JSON Object ({file_path}) ===")
+        output = json_dumps(parsed_data, indent=True)
+        print(output)
+
+        # Save the JSON to a file
+        output_filename = "parsed_data.json" if len(file_paths) == 1 else f"{Path(file_path).stem}_parsed.json"
+        with open(output_filename, "w", encoding="utf-8") as f:
+            f.write(output)
+
+        print(f"\nJSON data saved to {output_filename}")
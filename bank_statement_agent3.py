@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 import os
+import sys
+import hashlib
+import mmap
+import functools
+import copy
 import asyncio
 import json
 import re
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_ext.models.anthropic import AnthropicChatCompletionClient
+from anthropic import AsyncAnthropic
 from autogen_agentchat.agents import AssistantAgent, CodeExecutorAgent
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.conditions import MaxMessageTermination, TextMentionTermination
@@ -12,65 +18,168 @@ from autogen_agentchat.base import TerminationCondition
 from autogen_agentchat.messages import BaseAgentEvent, BaseChatMessage, StopMessage
 from typing import Sequence
 from autogen_agentchat.messages import TextMessage
+from autogen_core.models import SystemMessage, UserMessage
 from autogen_ext.code_executors.local import LocalCommandLineCodeExecutor
 from autogen_ext.code_executors.docker import DockerCommandLineCodeExecutor
 from autogen_agentchat.ui import Console
 from dotenv import load_dotenv
+from pathlib import Path
 
 load_dotenv()
 
+# orjson is a much faster drop-in for the JSON we parse and save; fall back to
+# the stdlib when it is not installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_loads(text: str):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+def json_dumps(obj, indent: bool = False) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
 # === CONFIGURATION ===
 BANK_STATEMENT_FILE = "temp/statement.txt"  # Text file containing raw statement
 ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "claude-sonnet-4-20250514")  # Default model
 # ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "claude-3-5-haiku-latest")  # Default model
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")  # Must be set in your .env
+CATEGORIZER_MAX_TOKENS = 16384  # Output budget for a batched categorizer request (the whole JSON is echoed back)
+BATCH_POLL_SECONDS = 30  # How often to check whether a message batch has finished
+MAX_PARALLEL_STATEMENTS = int(os.getenv("MAX_PARALLEL_STATEMENTS", "4"))  # Statements parsed at once
+MMAP_MIN_BYTES = 1 << 20  # Statements at least this large are read through mmap
+CATEGORIZER_USE_TEAM = os.getenv("CATEGORIZER_USE_TEAM") == "1"  # Run Stage 2 as a streamed team (debugging)
 
 if not ANTHROPIC_API_KEY:
     raise EnvironmentError("Please set the ANTHROPIC_API_KEY environment variable.")
 
 # === Helper to read statement text ===
 def load_statement(file_path: str) -> str:
-    with open(file_path, "r", encoding="utf-8") as f:
-        return f.read()
+    with open(file_path, "rb") as f:
+        # Large statements are decoded straight from a memory map instead of
+        # being copied through the file buffer first; mmap can't map an
+        # empty file, and small ones aren't worth the setup.
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_BYTES:
+            return f.read().decode("utf-8")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return str(mm, "utf-8")
 
 # ----------------------------
 # Robust JSON extraction logic
 # ----------------------------
+_FENCE_RE = re.compile(r"```(?:json|python)?", re.IGNORECASE)
+_JSON_TOKEN_RE = re.compile(r'[{}"\\]')
+
+def _scan_json_object(text2: str, pos: int = 0):
+    """
+    Returns (first parseable {...} object from `pos`, -1), or (None, start of
+    an unclosed or unparseable candidate), or (None, -1).
+
+    Single pass over the structural characters only ({, }, " and \\).
+    String state is tracked inside a candidate object, so braces inside
+    string values (descriptions, embedded code) never unbalance the count.
+    A candidate that fails to parse (e.g. `{x: {"a": 1}}`) is reported by its
+    start so the caller can resume just after it and still find nested objects.
+    """
+    depth = 0
+    start = -1
+    in_string = False
+    escaped_pos = -1
+    for match in _JSON_TOKEN_RE.finditer(text2, pos):
+        i = match.start()
+        ch = text2[i]
+        if depth == 0:
+            if ch == "{":
+                depth = 1
+                start = i
+            continue
+        if in_string:
+            if i == escaped_pos:
+                continue
+            if ch == "\\":
+                escaped_pos = i + 1
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                try:
+                    return json_loads(text2[start:i+1]), -1
+                except json.JSONDecodeError:
+                    # parsing failed; the caller resumes just after its '{'
+                    return None, start
+    return None, start
+
 def extract_json_from_text(text: str):
     """Return parsed JSON object found in text or None."""
     if not text or not isinstance(text, str):
         return None
 
-    # strip common code fences
-    text2 = re.sub(r"```(?:json|python)?", "", text, flags=re.IGNORECASE)
+    # strip common code fences (only when there are any)
+    text2 = _FENCE_RE.sub("", text) if "```" in text else text
+
+    # The cached object is shared, so each caller gets its own copy
+    return copy.deepcopy(_extract_json_cached(text2))
 
+# Retry loops often re-emit the exact same output (e.g. an executor error
+# followed by an unchanged rerun), so identical fence-stripped texts are
+# only tokenized once. Only extract_json_from_text should call this.
+@functools.lru_cache(maxsize=128)
+def _extract_json_cached(text2: str):
     # Try quick parse if text is (mostly) JSON
     stripped = text2.strip()
     if stripped.startswith("{") and stripped.endswith("}"):
         try:
-            return json.loads(stripped)
-        except Exception:
+            return json_loads(stripped)
+        except json.JSONDecodeError:
             pass
 
-    # Find first balanced {...} substring and try parsing progressively
-    start = text2.find("{")
-    while start != -1:
-        depth = 0
-        for i in range(start, len(text2)):
-            ch = text2[i]
-            if ch == "{":
-                depth += 1
-            elif ch == "}":
-                depth -= 1
-                if depth == 0:
-                    candidate = text2[start:i+1]
-                    # try parse
-                    try:
-                        return json.loads(candidate)
-                    except Exception:
-                        # parsing failed; continue searching for next '{'
-                        break
-        start = text2.find("{", start + 1)
+    # An unclosed or unparseable '{' (e.g. in prose) would swallow the rest of
+    # the text, so scanning resumes just after it.
+    pos = 0
+    while True:
+        parsed, unclosed_start = _scan_json_object(text2, pos)
+        if parsed is not None or unclosed_start == -1:
+            return parsed
+        pos = unclosed_start + 1
+
+def message_json(msg, parsed_messages: dict):
+    """
+    Return the JSON object found in a message's content, or None.
+
+    `parsed_messages` is one team run's memo, shared by its termination
+    condition and the result harvest so each message is tokenized at most
+    once. It is keyed by id(msg); the message is kept in the entry so its id
+    can't be reused while cached.
+    """
+    entry = parsed_messages.get(id(msg))
+    if entry is not None and entry[0] is msg:
+        return entry[1]
+    content = getattr(msg, "content", None)
+    # normalize content to string for searching
+    try:
+        content_str = content if isinstance(content, str) else str(content)
+    except Exception:
+        content_str = None
+    parsed = extract_json_from_text(content_str) if content_str else None
+    parsed_messages[id(msg)] = (msg, parsed)
+    return parsed
+
+def newest_message_from(messages, source: str):
+    """Return the last message sent by `source`, walking back by index."""
+    for i in range(len(messages) - 1, -1, -1):
+        if getattr(messages[i], "source", "") == source:
+            return messages[i]
     return None
 
 # ----------------------------
@@ -79,8 +188,9 @@ def extract_json_from_text(text: str):
 class JSONSuccessTermination(TerminationCondition):
     """Terminates when valid JSON is found in executor output."""
     
-    def __init__(self):
+    def __init__(self, parsed_messages: dict):
         self._terminated = False
+        self._parsed_messages = parsed_messages
     
     @property
     def terminated(self) -> bool:
@@ -90,16 +200,15 @@ class JSONSuccessTermination(TerminationCondition):
         if self._terminated:
             return None
             
-        # Check the messages for executor output with valid JSON
-        for msg in reversed(messages[-3:]):  # Check last 3 messages
-            if getattr(msg, "source", "") == "executor":
-                content = getattr(msg, "content", "")
-                if extract_json_from_text(content) is not None:
-                    self._terminated = True
-                    return StopMessage(
-                        content="Valid JSON found in executor output.",
-                        source="JSONSuccessTermination"
-                    )
+        # The team passes only the messages produced since the last check, so
+        # only the newest executor message among them needs parsing.
+        msg = newest_message_from(messages, "executor")
+        if msg is not None and message_json(msg, self._parsed_messages) is not None:
+            self._terminated = True
+            return StopMessage(
+                content="Valid JSON found in executor output.",
+                source="JSONSuccessTermination"
+            )
         return None
     
     async def reset(self) -> None:
@@ -107,23 +216,24 @@ class JSONSuccessTermination(TerminationCondition):
 
 def has_categories(json_obj) -> bool:
     """Check if JSON contains categorized transactions."""
-    try:
-        transactions_by_cardholder = json_obj.get("transactions_by_cardholder", {})
-        for cardholder, transactions in transactions_by_cardholder.items():
-            if isinstance(transactions, list) and len(transactions) > 0:
-                # Check if at least one transaction has a category
-                for transaction in transactions:
-                    if isinstance(transaction, dict) and "category" in transaction:
-                        return True
+    if not isinstance(json_obj, dict):
         return False
-    except Exception:
+    transactions_by_cardholder = json_obj.get("transactions_by_cardholder")
+    if not isinstance(transactions_by_cardholder, dict):
         return False
+    # Stops at the first transaction that has a category
+    return any(
+        "category" in transaction
+        for transactions in transactions_by_cardholder.values() if isinstance(transactions, list)
+        for transaction in transactions if isinstance(transaction, dict)
+    )
 
 class CategorizationSuccessTermination(TerminationCondition):
     """Terminates when categorized JSON is found in categorizer output."""
     
-    def __init__(self):
+    def __init__(self, parsed_messages: dict):
         self._terminated = False
+        self._parsed_messages = parsed_messages
     
     @property
     def terminated(self) -> bool:
@@ -133,112 +243,116 @@ class CategorizationSuccessTermination(TerminationCondition):
         if self._terminated:
             return None
             
-        # Check the messages for categorizer output with valid JSON containing categories
-        for msg in reversed(messages[-2:]):  # Check last 2 messages
-            if getattr(msg, "source", "") == "categorizer":
-                content = getattr(msg, "content", "")
-                parsed_json = extract_json_from_text(content)
-                if parsed_json and has_categories(parsed_json):
-                    self._terminated = True
-                    return StopMessage(
-                        content="Categorized JSON found in categorizer output.",
-                        source="CategorizationSuccessTermination"
-                    )
+        # Only the newest categorizer message since the last check is parsed.
+        msg = newest_message_from(messages, "categorizer")
+        if msg is None:
+            return None
+        parsed_json = message_json(msg, self._parsed_messages)
+        if parsed_json and has_categories(parsed_json):
+            self._terminated = True
+            return StopMessage(
+                content="Categorized JSON found in categorizer output.",
+                source="CategorizationSuccessTermination"
+            )
         return None
     
     async def reset(self) -> None:
         self._terminated = False
 
-async def run_parsing_agent():
-    statement_text = load_statement(BANK_STATEMENT_FILE)
-
-    # Create the model client
-    model_client = AnthropicChatCompletionClient(
-        model=ANTHROPIC_MODEL, api_key=ANTHROPIC_API_KEY)
+# ----------------------------
+# Agent prompts
+# ----------------------------
+PARSER_SYSTEM_MESSAGE = (
+    "You are a Python developer assistant. You will receive a raw bank "
+    "statement and the name of the file it is saved in. Write a single "
+    "```python``` code block that:\n"
+    "1. Parses `statement_text` into a JSON object with keys:\n"
+    "   - 'transactions_by_cardholder': a dictionary where each key is a cardholder name "
+    "     and the value is a list of {sale_date, post_date, description, amount}.\n"
+    "   - 'summary': contains 'bank_name', 'total_transactions','total_amount','previous_balance','payments','credits','purchases','cash_advances','fees','interest','new_balance', rewards_balance, 'available_credit_limit'.\n"
+    "2. Ensure amounts are numbers (floats) and NOT zero.\n"
+    "3. Ensure transactions for all cardholders are captured correctly. It is very rare to have no transactions for a cardholder if there are multiple card holders.\n"
+    "4. Prints **only** the JSON via `print(json.dumps(parsed, ensure_ascii=False))`.\n"
+    "5. IMPORTANT: Load it with `statement_text = open(<file>, encoding='utf-8').read()` - never paste the statement into the code.\n"
+    "Do not output any explanation or extra text. Once the JSON is successfully printed, "
+    "you are done - do not continue the conversation."
+)
+
+CATEGORIZER_SYSTEM_MESSAGE = (
+    "You are an AI financial analyst. Your purpose is to categorize financial transactions "
+    "into a few broad categories.\n\n"
+    "You will receive a JSON object that contains:\n"
+    "1. 'transactions_by_cardholder': a dictionary where each key is a cardholder name and "
+    "   the value is a list of transaction objects.\n"
+    "2. 'summary': a dictionary with account summary data.\n\n"
+    "Your job:\n"
+    "- Return the exact same JSON object structure.\n"
+    "- Do NOT remove or rename any keys.\n"
+    "- Do NOT modify the 'summary' section.\n"
+    "- Inside 'transactions_by_cardholder', for each transaction object, add a new key-value "
+    "  pair: \"category\": \"Category Name\".\n\n"
+    "CRITICAL RULES:\n"
+    "Use ONLY the 6 categories defined below.\n"
+    "For payments, refunds, and fees, use the Financial Transactions category.\n"
+    "If a description is too vague, use Uncategorized.\n\n"
+    "CATEGORY DEFINITIONS:\n"
+    "Food & Dining: All food-related spending. This includes both groceries from supermarkets "
+    "and purchases from restaurants, cafes, bars, and food delivery services.\n"
+    "Merchandise & Services: A broad category for general shopping and personal care. "
+    "This includes retail stores, online marketplaces (like Amazon), electronics, clothing, "
+    "hobbies, entertainment, streaming services (Netflix), gym memberships, and drugstores (CVS).\n"
+    "Bills & Subscriptions: Recurring charges for essential services. This primarily includes "
+    "utilities (phone, internet) and insurance payments.\n"
+    "Travel & Transportation: Costs for getting around. This includes daily transport (gas stations, "
+    "Uber, public transit) and long-distance travel (airlines, hotels, rental cars).\n"
+    "Financial Transactions: All non-spending activities that affect your balance. This includes "
+    "payments made to your account, refunds from merchants, statement credits, and any fees or interest charges.\n"
+    "Uncategorized: For any transaction that does not clearly fit into the categories above.\n\n"
+    "Output ONLY the JSON with categories added. Do not include any explanations or markdown formatting. "
+    "Once you output the categorized JSON, you are done - do not continue the conversation."
+)
+
+def categorizer_prompt(parsed_json) -> str:
+    return f"Here is the parsed JSON to categorize:\n{json_dumps(parsed_json)}"
 
+# ----------------------------
+# Stage 1: Assistant + Executor to parse the statement
+# ----------------------------
+async def parse_statement(statement_text: str, model_client, code_executor):
     # Assistant agent: writes code to parse the statement
     assistant = AssistantAgent(
         name="assistant",
         model_client=model_client,
-        system_message=(
-            "You are a Python developer assistant. You will receive a raw bank "
-            "statement text stored in a variable named `statement_text`. Write a single "
-            "```python``` code block that:\n"
-            "1. Parses `statement_text` into a JSON object with keys:\n"
-            "   - 'transactions_by_cardholder': a dictionary where each key is a cardholder name "
-            "     and the value is a list of {sale_date, post_date, description, amount}.\n"
-            "   - 'summary': contains 'bank_name', 'total_transactions','total_amount','previous_balance','payments','credits','purchases','cash_advances','fees','interest','new_balance', rewards_balance, 'available_credit_limit'.\n"
-            "2. Ensure amounts are numbers (floats) and NOT zero.\n"
-            "3. Ensure transactions for all cardholders are captured correctly. It is very rare to have no transactions for a cardholder if there are multiple card holders.\n"
-            "4. Prints **only** the JSON via `print(json.dumps(parsed, ensure_ascii=False))`.\n"
-            "5. IMPORTANT: The variable `statement_text` is already defined - just use it directly.\n"
-            "Do not output any explanation or extra text. Once the JSON is successfully printed, "
-            "you are done - do not continue the conversation."
-        ),
+        system_message=PARSER_SYSTEM_MESSAGE,
         reflect_on_tool_use=True
     )
 
-    # Code executor
-    code_executor = DockerCommandLineCodeExecutor(work_dir="temp")
-    await code_executor.start()
-
     # Code execution agent
     executor_agent = CodeExecutorAgent(
         name="executor",
         code_executor=code_executor
     )
 
-    # --- Categorizer Agent ---
-    categorizer_agent = AssistantAgent(
-        name="categorizer",
-        model_client=model_client,
-        system_message=(
-            "You are an AI financial analyst. Your purpose is to categorize financial transactions "
-            "into a few broad categories.\n\n"
-            "You will receive a JSON object that contains:\n"
-            "1. 'transactions_by_cardholder': a dictionary where each key is a cardholder name and "
-            "   the value is a list of transaction objects.\n"
-            "2. 'summary': a dictionary with account summary data.\n\n"
-            "Your job:\n"
-            "- Return the exact same JSON object structure.\n"
-            "- Do NOT remove or rename any keys.\n"
-            "- Do NOT modify the 'summary' section.\n"
-            "- Inside 'transactions_by_cardholder', for each transaction object, add a new key-value "
-            "  pair: \"category\": \"Category Name\".\n\n"
-            "CRITICAL RULES:\n"
-            "Use ONLY the 6 categories defined below.\n"
-            "For payments, refunds, and fees, use the Financial Transactions category.\n"
-            "If a description is too vague, use Uncategorized.\n\n"
-            "CATEGORY DEFINITIONS:\n"
-            "Food & Dining: All food-related spending. This includes both groceries from supermarkets "
-            "and purchases from restaurants, cafes, bars, and food delivery services.\n"
-            "Merchandise & Services: A broad category for general shopping and personal care. "
-            "This includes retail stores, online marketplaces (like Amazon), electronics, clothing, "
-            "hobbies, entertainment, streaming services (Netflix), gym memberships, and drugstores (CVS).\n"
-            "Bills & Subscriptions: Recurring charges for essential services. This primarily includes "
-            "utilities (phone, internet) and insurance payments.\n"
-            "Travel & Transportation: Costs for getting around. This includes daily transport (gas stations, "
-            "Uber, public transit) and long-distance travel (airlines, hotels, rental cars).\n"
-            "Financial Transactions: All non-spending activities that affect your balance. This includes "
-            "payments made to your account, refunds from merchants, statement credits, and any fees or interest charges.\n"
-            "Uncategorized: For any transaction that does not clearly fit into the categories above.\n\n"
-            "Output ONLY the JSON with categories added. Do not include any explanations or markdown formatting. "
-            "Once you output the categorized JSON, you are done - do not continue the conversation."
-        ),
-        reflect_on_tool_use=False
-    )
-
-    # STAGE 1: Assistant + Executor to parse the statement
     # Using custom termination condition that stops when valid JSON is found
-    json_termination = JSONSuccessTermination()
+    parsed_messages = {}
+    json_termination = JSONSuccessTermination(parsed_messages)
     parsing_team = RoundRobinGroupChat(
         participants=[assistant, executor_agent],
         termination_condition=json_termination
     )
 
+    # The code reads the statement from the shared work dir instead of
+    # echoing it back as a string literal (which also broke on triple quotes).
+    statement_file = f"statement_{hashlib.sha256(statement_text.encode('utf-8')).hexdigest()[:12]}.in"
+    (Path("temp") / statement_file).write_text(statement_text, encoding="utf-8")
+
     # Send the statement as initial task
     task = TextMessage(
-        content=f"statement_text = '''{statement_text}'''",
+        content=(
+            f"The statement is saved as `{statement_file}` in the working directory. "
+            "Its text is shown below for reference only:\n\n"
+            f"{statement_text}"
+        ),
         source="user"
     )
 
@@ -249,8 +363,7 @@ async def run_parsing_agent():
     parsed_json = None
     for msg in parsing_result.messages:
         if getattr(msg, "source", "") == "executor":
-            content = getattr(msg, "content", "")
-            parsed_json = extract_json_from_text(content)
+            parsed_json = message_json(msg, parsed_messages)
             if parsed_json:
                 break
 
@@ -258,15 +371,49 @@ async def run_parsing_agent():
         raise ValueError("Failed to parse statement in Stage 1")
 
     print("Stage 1 completed successfully. JSON extracted.")
+    return parsed_json
+
+# ----------------------------
+# Stage 2: Categorizer processes the parsed JSON
+# ----------------------------
+async def categorize_statement(parsed_json, model_client):
+    """
+    One-shot categorization: a single model call with the categorizer prompt,
+    without a team, Console streaming or termination polling around it.
+    """
+    if CATEGORIZER_USE_TEAM:
+        return await categorize_statement_with_team(parsed_json, model_client)
+
+    print("Stage 2: Categorizing transactions...")
+    response = await model_client.create([
+        SystemMessage(content=CATEGORIZER_SYSTEM_MESSAGE),
+        UserMessage(content=categorizer_prompt(parsed_json), source="user"),
+    ])
+    content = response.content if isinstance(response.content, str) else ""
+    categorized = extract_json_from_text(content)
+    if categorized and has_categories(categorized):
+        return categorized
+
+    print(f"\n[DEBUG] No categorized JSON detected. Using Stage 1 result:\n{content[:800]!r}")
+    return parsed_json
+
+async def categorize_statement_with_team(parsed_json, model_client):
+    """Stage 2 as a single-agent team with streamed output, for debugging."""
+    categorizer_agent = AssistantAgent(
+        name="categorizer",
+        model_client=model_client,
+        system_message=CATEGORIZER_SYSTEM_MESSAGE,
+        reflect_on_tool_use=False
+    )
 
-    # STAGE 2: Categorizer processes the parsed JSON
     categorizer_task = TextMessage(
-        content=f"Here is the parsed JSON to categorize:\n```json\n{json.dumps(parsed_json, indent=2)}\n```",
+        content=categorizer_prompt(parsed_json),
         source="user"
     )
 
     # Using custom termination condition that stops when categorized JSON is found
-    categorization_termination = CategorizationSuccessTermination()
+    parsed_messages = {}
+    categorization_termination = CategorizationSuccessTermination(parsed_messages)
     categorizer_team = RoundRobinGroupChat(
         participants=[categorizer_agent],
         termination_condition=categorization_termination
@@ -275,42 +422,19 @@ async def run_parsing_agent():
     print("Stage 2: Categorizing transactions...")
     categorization_result = await Console(categorizer_team.run_stream(task=categorizer_task))
 
-    # Stop executor safely
-    await code_executor.stop()
-
-    # Search categorization result for final JSON
-    final_parsed_json = None
-
-    # 1) prefer categorizer messages
-    for msg in categorization_result.messages:
-        src = getattr(msg, "source", "")
-        content = getattr(msg, "content", None)
-        # normalize content to string for searching
-        try:
-            content_str = content if isinstance(content, str) else str(content)
-        except Exception:
-            content_str = None
-
-        if not content_str:
-            continue
-
-        if src == "categorizer":
-            final_parsed_json = extract_json_from_text(content_str)
-            if final_parsed_json is not None:
-                return final_parsed_json
-
-    # 2) fallback: check all messages in categorization result
+    # Search categorization result for final JSON in one pass: a categorizer
+    # message wins, otherwise the first JSON from any source is used
+    first_any = None
     for msg in categorization_result.messages:
-        content = getattr(msg, "content", None)
-        try:
-            content_str = content if isinstance(content, str) else str(content)
-        except Exception:
-            content_str = None
-        if not content_str:
+        final_parsed_json = message_json(msg, parsed_messages)
+        if final_parsed_json is None:
             continue
-        final_parsed_json = extract_json_from_text(content_str)
-        if final_parsed_json is not None:
+        if getattr(msg, "source", "") == "categorizer":
             return final_parsed_json
+        if first_any is None:
+            first_any = final_parsed_json
+    if first_any is not None:
+        return first_any
 
     # 3) If still not found — print helpful debug info and return the parsed JSON from stage 1
     print("\n[DEBUG] No categorized JSON detected. Using Stage 1 result:")
@@ -326,15 +450,175 @@ async def run_parsing_agent():
     # Return the original parsed JSON from stage 1 as fallback
     return parsed_json
 
+async def categorize_with_message_batch(parsed_jsons: list) -> list:
+    """
+    Categorizes several parsed statements with one Anthropic Message Batch.
+
+    Batched requests are billed at half price but can take minutes to finish,
+    so this is meant for bulk archives rather than interactive runs. A
+    statement whose request fails keeps its Stage 1 JSON.
+    """
+    client = AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
+    batch = await client.messages.batches.create(requests=[
+        {
+            "custom_id": f"statement-{idx}",
+            "params": {
+                "model": ANTHROPIC_MODEL,
+                "max_tokens": CATEGORIZER_MAX_TOKENS,
+                "system": CATEGORIZER_SYSTEM_MESSAGE,
+                "messages": [{"role": "user", "content": categorizer_prompt(parsed_json)}],
+            },
+        }
+        for idx, parsed_json in enumerate(parsed_jsons)
+    ])
+    print(f"Stage 2: Submitted message batch {batch.id} for {len(parsed_jsons)} statements...")
+
+    while batch.processing_status != "ended":
+        await asyncio.sleep(BATCH_POLL_SECONDS)
+        batch = await client.messages.batches.retrieve(batch.id)
+
+    results = list(parsed_jsons)
+    async for entry in await client.messages.batches.results(batch.id):
+        if entry.result.type != "succeeded":
+            print(f"[WARN] {entry.custom_id}: {entry.result.type}, using Stage 1 result")
+            continue
+        text = "".join(block.text for block in entry.result.message.content if block.type == "text")
+        categorized = extract_json_from_text(text)
+        if categorized and has_categories(categorized):
+            results[int(entry.custom_id.rsplit("-", 1)[1])] = categorized
+    return results
+
+# ----------------------------
+# Shared code executor
+# ----------------------------
+# Starting a Docker container costs seconds, so the executor is started once
+# and reused by every run instead of being started and stopped per statement.
+_CODE_EXECUTOR = None
+_CODE_EXECUTOR_LOCK = asyncio.Lock()
+
+async def get_code_executor() -> DockerCommandLineCodeExecutor:
+    global _CODE_EXECUTOR
+    # Concurrent first callers must not each start a container.
+    async with _CODE_EXECUTOR_LOCK:
+        if _CODE_EXECUTOR is None:
+            _CODE_EXECUTOR = DockerCommandLineCodeExecutor(work_dir="temp")
+            await _CODE_EXECUTOR.start()
+    return _CODE_EXECUTOR
+
+async def close_code_executor() -> None:
+    global _CODE_EXECUTOR
+    if _CODE_EXECUTOR is not None:
+        await _CODE_EXECUTOR.stop()
+        _CODE_EXECUTOR = None
+
+async def run_parsing_agent(statement_text: str = None, model_client=None, code_executor=None):
+    """
+    Parses and categorizes one statement. `statement_text` defaults to the
+    contents of BANK_STATEMENT_FILE; a model client and a started executor
+    can be passed in so concurrent runs share them.
+    """
+    if statement_text is None:
+        statement_text = load_statement(BANK_STATEMENT_FILE)
+
+    # Create the model client
+    if model_client is None:
+        model_client = AnthropicChatCompletionClient(
+            model=ANTHROPIC_MODEL, api_key=ANTHROPIC_API_KEY)
+
+    if code_executor is None:
+        code_executor = await get_code_executor()
+    parsed_json = await parse_statement(statement_text, model_client, code_executor)
+
+    return await categorize_statement(parsed_json, model_client)
+
+async def run_all(file_paths: list) -> list:
+    """
+    Parses several statements concurrently so their LLM round-trips overlap.
+    Returns one result per path, in order; a failed statement's entry is the
+    exception it raised.
+    """
+    model_client = AnthropicChatCompletionClient(
+        model=ANTHROPIC_MODEL, api_key=ANTHROPIC_API_KEY)
+
+    # One executor container serves every statement; the semaphore keeps the
+    # number of live conversations within the Anthropic rate limits.
+    code_executor = await get_code_executor()
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_STATEMENTS)
+
+    # Loading happens inside each task, so an unreadable file is reported as
+    # that statement's failure instead of aborting the whole run.
+    async def run_one(file_path: str):
+        async with semaphore:
+            return await run_parsing_agent(load_statement(file_path), model_client, code_executor)
+
+    return await asyncio.gather(*(run_one(file_path) for file_path in file_paths), return_exceptions=True)
+
+async def run_parsing_agent_batch(file_paths: list) -> list:
+    """
+    Parses each statement (Stage 1 needs the code executor, so it can't be
+    batched) and then categorizes all of them in a single message batch.
+    Returns one result per path, in order; a failed statement's entry is the
+    exception it raised, as in run_all.
+    """
+    model_client = AnthropicChatCompletionClient(
+        model=ANTHROPIC_MODEL, api_key=ANTHROPIC_API_KEY)
+
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_STATEMENTS)
+
+    # The executor is only needed for Stage 1, so it is stopped before the
+    # (possibly minutes-long) wait on the message batch.
+    try:
+        code_executor = await get_code_executor()
+
+        async def parse_one(file_path: str):
+            async with semaphore:
+                return await parse_statement(load_statement(file_path), model_client, code_executor)
+
+        results = await asyncio.gather(*(parse_one(file_path) for file_path in file_paths),
+                                       return_exceptions=True)
+    finally:
+        await close_code_executor()
+
+    # Only the statements that parsed go into the batch; the others keep
+    # their exception so one failure doesn't discard the rest.
+    parsed = [idx for idx, result in enumerate(results) if not isinstance(result, BaseException)]
+    if parsed:
+        categorized = await categorize_with_message_batch([results[idx] for idx in parsed])
+        for idx, categorized_json in zip(parsed, categorized):
+            results[idx] = categorized_json
+    return results
+
+
+async def main(file_paths: list, batch: bool = False) -> list:
+    """Runs every statement and stops the shared executor afterwards."""
+    try:
+        if batch:
+            return await run_parsing_agent_batch(file_paths)
+        return await run_all(file_paths)
+    finally:
+        await close_code_executor()
 
 if __name__ == "__main__":
-    parsed_data = asyncio.run(run_parsing_agent())
-    print("\n=== Final Parsed JSON Object ===")
-    print(json.dumps(parsed_data, indent=2, ensure_ascii=False))
-
-    # Save the JSON to a file
-    output_filename = "parsed_data.json"
-    with open(output_filename, "w", encoding="utf-8") as f:
-        json.dump(parsed_data, f, indent=2, ensure_ascii=False)
-    
-    print(f"\nJSON data saved to {output_filename}")
\ No newline at end of file
+    # --batch categorizes every statement in one half-price Message Batch.
+    args = sys.argv[1:]
+    batch = "--batch" in args
+    file_paths = [arg for arg in args if arg != "--batch"] or [BANK_STATEMENT_FILE]
+    results = asyncio.run(main(file_paths, batch=batch))
+    for file_path, parsed_data in zip(file_paths, results):
+        if isinstance(parsed_data, BaseException):
+            print(f"\n[ERROR] {file_path}: {parsed_data}")
+            continue
+        print(f"\n=== Final Parsed JSON Object ({file_path}) ===")
+        pretty_json = json_dumps(parsed_data, indent=True)
+        print(pretty_json)
+
+        # Save compact JSON for machines, plus the already-rendered pretty
+        # copy next to it for humans
+        output_filename = "parsed_data.json" if len(file_paths) == 1 else f"{Path(file_path).stem}_parsed.json"
+        with open(output_filename, "w", encoding="utf-8") as f:
+            f.write(json_dumps(parsed_data))
+        pretty_filename = str(Path(output_filename).with_suffix(".pretty.json"))
+        with open(pretty_filename, "w", encoding="utf-8") as f:
+            f.write(pretty_json)
+
+        print(f"\nJSON data saved to {output_filename} (pretty copy: {pretty_filename})")
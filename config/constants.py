@@ -1,5 +1,13 @@
+import os
+
 TIMEOUT_DOCKER = 300
 WORK_DIR_DOCKER = 'temp'
 DOCKER_IMAGE = 'amancevice/pandas'
+EXECUTOR_PACKAGES = ['google-re2', 'orjson']  # Baked into the executor image once, so generated scripts never install them
 MODEL_OPENAI = 'gpt-4o'  # You can change this to 'gpt-3.5-turbo' for higher rate limits
-# MODEL_OPENAI = 'o4-mini' 
\ No newline at end of file
+# MODEL_OPENAI = 'o4-mini' 
+MAX_CONCURRENT_PDF_PARSES = 4  # Upper bound on parallel LLM parse conversations per PDF
+PAGES_PER_PARSE_BATCH = 4  # PDF pages sent to the parser in one conversation
+MAX_PARSE_BATCH_CHARS = 24000  # Keeps a page batch well inside the model's context window
+PARSE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "finance_tracker")  # On-disk cache of parsed PDF results
+SCRIPT_CACHE_DB = os.path.join(PARSE_CACHE_DIR, "scripts.db")  # Parser scripts keyed by statement layout
@@ -1,9 +1,42 @@
+import functools
+import hashlib
+import io
 from autogen_ext.code_executors.docker import DockerCommandLineCodeExecutor
-from config.constants import WORK_DIR_DOCKER, TIMEOUT_DOCKER, DOCKER_IMAGE
+from config.constants import WORK_DIR_DOCKER, TIMEOUT_DOCKER, DOCKER_IMAGE, EXECUTOR_PACKAGES
+
+@functools.lru_cache(maxsize=1)
+def get_executor_image() -> str:
+    """
+    Returns an image with EXECUTOR_PACKAGES baked in on top of DOCKER_IMAGE.
+
+    The image is built once and then reused by tag (the tag hashes the base
+    image and package list), so starting an executor never pip-installs
+    anything. Building is best-effort: without Docker access or network the
+    plain DOCKER_IMAGE is used and scripts fall back to the stdlib.
+    """
+    if not EXECUTOR_PACKAGES:
+        return DOCKER_IMAGE
+    spec = "\n".join([DOCKER_IMAGE, *EXECUTOR_PACKAGES]).encode("utf-8")
+    tag = f"finance-tracker-executor:{hashlib.sha256(spec).hexdigest()[:12]}"
+    try:
+        import docker
+        client = docker.from_env()
+        try:
+            client.images.get(tag)
+            return tag
+        except docker.errors.ImageNotFound:
+            pass
+        print(f"Building executor image {tag} with: {', '.join(EXECUTOR_PACKAGES)}")
+        dockerfile = f"FROM {DOCKER_IMAGE}\nRUN pip install --no-cache-dir {' '.join(EXECUTOR_PACKAGES)}\n"
+        client.images.build(fileobj=io.BytesIO(dockerfile.encode("utf-8")), tag=tag, rm=True)
+        return tag
+    except Exception as e:
+        print(f"Could not build executor image, using {DOCKER_IMAGE}: {e}")
+        return DOCKER_IMAGE
 
 def get_docker_executor():
     docker_executor = DockerCommandLineCodeExecutor(
-        image=DOCKER_IMAGE,
+        image=get_executor_image(),
         work_dir=WORK_DIR_DOCKER,
         timeout=TIMEOUT_DOCKER
     )
@@ -14,11 +14,14 @@ import asyncio
 import json
 import re
 import glob
+import fnmatch
+import functools
 import argparse
 import shutil
 import base64
 import sys
 import traceback
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import List, Sequence
 from autogen_ext.models.openai import OpenAIChatCompletionClient
@@ -52,11 +55,21 @@ TEMP_DIR = "temp"
 OUTPUT_DIR = "temp/parsed_statements"
 FINAL_OUTPUT_DIR = "output"
 COMBINED_JSON_FILE = "combined_parsed_data.json"
+MAX_CONCURRENT_STATEMENTS = int(os.getenv("MAX_CONCURRENT_STATEMENTS", "4"))  # Statements parsed at once
+# Optional size limit; larger statements fail instead of being sent to the model (unset: no limit)
+MAX_STATEMENT_BYTES = int(os.getenv("MAX_STATEMENT_BYTES", "0")) or None
 
 # ============================================================================
 # STEP 1: PDF CONVERSION (from pdf_converter.py)
 # ============================================================================
 
+def _extract_pdf_text(file_path: str) -> str:
+    """Extracts the text of a PDF, with each non-empty page followed by a newline."""
+    reader = pypdf.PdfReader(file_path)
+    return "".join(
+        page_text + "\n" for page_text in (page.extract_text() for page in reader.pages) if page_text
+    )
+
 def convert_pdfs_in_dir(input_dir: str, output_dir: str = TEMP_DIR) -> List[str]:
     """
     Scans a directory for PDF files, extracts text, and saves each to a text file.
@@ -97,30 +110,29 @@ def convert_pdfs_in_dir(input_dir: str, output_dir: str = TEMP_DIR) -> List[str]
     
     created_text_files = []
 
-    # Enumerate through the list of discovered PDFs to process them
-    for i, file_path in enumerate(pdf_files, start=1):
-        try:
-            print(f"Processing '{file_path}'...")
-            reader = pypdf.PdfReader(file_path)
-            full_text = ""
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    full_text += page_text + "\n"
-            
-            # Define the output file name and path
-            output_filename = f"statement{i}.txt"
-            output_path = os.path.join(output_dir, output_filename)
-            
-            # Write the extracted text to the new file
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(full_text)
-            
-            created_text_files.append(output_path)
-            print(f"Successfully created '{output_path}'")
+    # Text extraction is CPU-bound, so PDFs are decoded in parallel worker
+    # processes; the files are still written in discovery order below.
+    with ProcessPoolExecutor(max_workers=min(len(pdf_files), os.cpu_count() or 1)) as pool:
+        futures = [pool.submit(_extract_pdf_text, file_path) for file_path in pdf_files]
 
-        except Exception as e:
-            print(f"Error processing file {file_path}: {str(e)}")
+        for i, (file_path, future) in enumerate(zip(pdf_files, futures), start=1):
+            try:
+                print(f"Processing '{file_path}'...")
+                full_text = future.result()
+
+                # Define the output file name and path
+                output_filename = f"statement{i}.txt"
+                output_path = os.path.join(output_dir, output_filename)
+
+                # Write the extracted text to the new file
+                with open(output_path, "w", encoding="utf-8") as f:
+                    f.write(full_text)
+
+                created_text_files.append(output_path)
+                print(f"Successfully created '{output_path}'")
+
+            except Exception as e:
+                print(f"Error processing file {file_path}: {str(e)}")
             
     return created_text_files
 
@@ -129,17 +141,53 @@ def convert_pdfs_in_dir(input_dir: str, output_dir: str = TEMP_DIR) -> List[str]
 # ============================================================================
 
 # === Helper functions ===
-def load_statement(file_path: str) -> str:
-    with open(file_path, "r", encoding="utf-8") as f:
-        return f.read()
+def _read_statement(file_path: str) -> str:
+    """Reads a statement, refusing files larger than MAX_STATEMENT_BYTES when it is set."""
+    with open(file_path, "rb") as f:
+        data = f.read() if MAX_STATEMENT_BYTES is None else f.read(MAX_STATEMENT_BYTES + 1)
+    if MAX_STATEMENT_BYTES is not None and len(data) > MAX_STATEMENT_BYTES:
+        # Parsing a partial statement would silently drop transactions.
+        raise ValueError(
+            f"{file_path} exceeds {MAX_STATEMENT_BYTES} bytes; "
+            f"raise or unset MAX_STATEMENT_BYTES to parse it"
+        )
+    return data.decode("utf-8")
+
+async def load_statement(file_path: str) -> str:
+    """Reads a statement off the event loop so concurrent statements keep making progress."""
+    return await asyncio.to_thread(_read_statement, file_path)
+
+def _write_json(path, data) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
 
 def ensure_output_dir(output_dir: str):
     """Create output directory if it doesn't exist."""
     Path(output_dir).mkdir(parents=True, exist_ok=True)
 
+@functools.lru_cache(maxsize=32)
+def _compile_name_pattern(name_pattern: str) -> re.Pattern:
+    return re.compile(fnmatch.translate(name_pattern))
+
 def get_statement_files(pattern: str) -> list:
     """Get list of statement files matching the pattern."""
-    files = glob.glob(pattern)
+    directory, name_pattern = os.path.split(pattern)
+    if glob.has_magic(directory):
+        files = glob.glob(pattern)
+    else:
+        # Fixed directory: one scandir pass, matching names without extra stat calls.
+        # Like glob, hidden files only match a pattern that itself starts with a dot.
+        matcher = _compile_name_pattern(name_pattern)
+        include_hidden = name_pattern.startswith(".")
+        try:
+            with os.scandir(directory or ".") as entries:
+                files = [
+                    os.path.join(directory, entry.name) for entry in entries
+                    if (include_hidden or not entry.name.startswith("."))
+                    and matcher.match(entry.name) and entry.is_file()
+                ]
+        except FileNotFoundError:
+            files = []
     files.sort()  # Sort for consistent processing order
     return files
 
@@ -189,10 +237,8 @@ def combine_parsed_data(individual_files: list) -> dict:
             # Merge transactions by cardholder and calculate totals
             if "transactions_by_cardholder" in data:
                 for cardholder, transactions in data["transactions_by_cardholder"].items():
-                    # Initialize cardholder in combined transactions
-                    if cardholder not in combined["combined_transactions_by_cardholder"]:
-                        combined["combined_transactions_by_cardholder"][cardholder] = []
-                    combined["combined_transactions_by_cardholder"][cardholder].extend(transactions)
+                    # Merge into combined transactions
+                    combined["combined_transactions_by_cardholder"].setdefault(cardholder, []).extend(transactions)
                     
                     # Initialize cardholder summary if not exists
                     if cardholder not in combined["summary_by_cardholder"]:
@@ -219,6 +265,8 @@ def combine_parsed_data(individual_files: list) -> dict:
                         }
                     
                     # Process each transaction
+                    cardholder_category_totals = combined["summary_by_cardholder"][cardholder]["category_totals"]
+                    category_totals = combined["category_totals"]
                     cardholder_transaction_count = 0
                     cardholder_total_amount = 0.0
                     cardholder_purchases = 0.0
@@ -238,15 +286,9 @@ def combine_parsed_data(individual_files: list) -> dict:
                             else:
                                 cardholder_purchases += amount
                             
-                            # Update category totals for cardholder
-                            if category not in combined["summary_by_cardholder"][cardholder]["category_totals"]:
-                                combined["summary_by_cardholder"][cardholder]["category_totals"][category] = 0.0
-                            combined["summary_by_cardholder"][cardholder]["category_totals"][category] += amount
-                            
-                            # Update overall category totals
-                            if category not in combined["category_totals"]:
-                                combined["category_totals"][category] = 0.0
-                            combined["category_totals"][category] += amount
+                            # Update category totals for cardholder and overall
+                            cardholder_category_totals[category] = cardholder_category_totals.get(category, 0.0) + amount
+                            category_totals[category] = category_totals.get(category, 0.0) + amount
                     
                     # Update cardholder totals
                     combined["summary_by_cardholder"][cardholder]["total_transactions"] += cardholder_transaction_count
@@ -284,51 +326,88 @@ def combine_parsed_data(individual_files: list) -> dict:
 # ----------------------------
 # Robust JSON extraction logic
 # ----------------------------
+_CODE_FENCE_RE = re.compile(r"```(?:json|python)?", re.IGNORECASE)
+_BRACE_RE = re.compile(r"[{}]")
+
 def extract_json_from_text(text: str):
     """Return parsed JSON object found in text or None."""
+    found = extract_json_with_source(text)
+    return found[0] if found is not None else None
+
+def extract_json_with_source(text: str):
+    """Return (parsed JSON object, the exact substring it was parsed from) or None."""
     if not text or not isinstance(text, str):
         return None
 
+    # Cheap rejection (both scans run in C): without a '{' followed somewhere
+    # by a '}' there is no object to find, e.g. a message still mid-stream.
+    first_open = text.find("{")
+    if first_open == -1 or text.rfind("}") < first_open:
+        return None
+
     # strip common code fences
-    text2 = re.sub(r"```(?:json|python)?", "", text, flags=re.IGNORECASE)
+    text2 = _CODE_FENCE_RE.sub("", text)
 
     # Try quick parse if text is (mostly) JSON
     stripped = text2.strip()
     if stripped.startswith("{") and stripped.endswith("}"):
         try:
-            return json.loads(stripped)
+            return json.loads(stripped), stripped
         except Exception:
             pass
 
-    # Find first balanced {...} substring and try parsing progressively
-    start = text2.find("{")
-    while start != -1:
+    # Left-to-right pass over the braces only (finditer runs in C); json.loads
+    # is only tried on spans that close back to depth 0.
+    pos = 0
+    while True:
         depth = 0
-        for i in range(start, len(text2)):
-            ch = text2[i]
-            if ch == "{":
+        top_start = -1
+        for match in _BRACE_RE.finditer(text2, pos):
+            i = match.start()
+            if text2[i] == "{":
+                if depth == 0:
+                    top_start = i
                 depth += 1
-            elif ch == "}":
+            elif depth > 0:
                 depth -= 1
                 if depth == 0:
-                    candidate = text2[start:i+1]
-                    # try parse
+                    span = text2[top_start:i+1]
                     try:
-                        return json.loads(candidate)
+                        return json.loads(span), span
                     except Exception:
-                        # parsing failed; continue searching for next '{'
+                        # e.g. `{x: {"a": 1}}`: retry from just inside it so
+                        # nested objects are still found
                         break
-        start = text2.find("{", start + 1)
-    return None
+        if top_start == -1:
+            return None
+        # An unclosed or unparseable '{' (e.g. in prose) swallowed the rest;
+        # resume after it
+        pos = top_start + 1
 
 # ----------------------------
 # Custom Termination condition classes (following Autogen 0.7.2 pattern)
 # ----------------------------
+def _unchecked_from(messages, source: str, checked_ids: set):
+    """Yields the newest-first messages from `source` not yet scanned, marking each as checked.
+
+    Completed chat messages never change, so a message that held no
+    matching JSON once is never scanned again on later calls.
+    """
+    for msg in reversed(messages):
+        if getattr(msg, "source", "") != source:
+            continue
+        key = getattr(msg, "id", None) or id(msg)
+        if key in checked_ids:
+            continue
+        checked_ids.add(key)
+        yield msg
+
 class JSONSuccessTermination(TerminationCondition):
     """Terminates when valid JSON is found in executor output."""
     
     def __init__(self):
         self._terminated = False
+        self._last_checked_ids: set = set()
     
     @property
     def terminated(self) -> bool:
@@ -338,32 +417,33 @@ class JSONSuccessTermination(TerminationCondition):
         if self._terminated:
             return None
             
-        # Check the messages for executor output with valid JSON
-        for msg in reversed(messages[-3:]):  # Check last 3 messages
-            if getattr(msg, "source", "") == "executor":
-                content = getattr(msg, "content", "")
-                if extract_json_from_text(content) is not None:
-                    self._terminated = True
-                    return StopMessage(
-                        content="Valid JSON found in executor output.",
-                        source="JSONSuccessTermination"
-                    )
+        # Check executor output not seen on an earlier call for valid JSON
+        for msg in _unchecked_from(messages, "executor", self._last_checked_ids):
+            content = getattr(msg, "content", "")
+            if extract_json_from_text(content) is not None:
+                self._terminated = True
+                return StopMessage(
+                    content="Valid JSON found in executor output.",
+                    source="JSONSuccessTermination"
+                )
         return None
     
     async def reset(self) -> None:
         self._terminated = False
+        self._last_checked_ids.clear()
 
 def has_categories(json_obj) -> bool:
     """Check if JSON contains categorized transactions."""
     try:
         transactions_by_cardholder = json_obj.get("transactions_by_cardholder", {})
-        for cardholder, transactions in transactions_by_cardholder.items():
-            if isinstance(transactions, list) and len(transactions) > 0:
-                # Check if at least one transaction has a category
-                for transaction in transactions:
-                    if isinstance(transaction, dict) and "category" in transaction:
-                        return True
-        return False
+        # The categorizer tags every transaction, so the first one is
+        # representative; no need to walk the whole statement.
+        first_transaction = next(
+            (t for transactions in transactions_by_cardholder.values()
+             if isinstance(transactions, list) for t in transactions if isinstance(t, dict)),
+            None
+        )
+        return first_transaction is not None and "category" in first_transaction
     except Exception:
         return False
 
@@ -372,6 +452,7 @@ class CategorizationSuccessTermination(TerminationCondition):
     
     def __init__(self):
         self._terminated = False
+        self._last_checked_ids: set = set()
     
     @property
     def terminated(self) -> bool:
@@ -381,33 +462,38 @@ class CategorizationSuccessTermination(TerminationCondition):
         if self._terminated:
             return None
             
-        # Check the messages for categorizer output with valid JSON containing categories
-        for msg in reversed(messages[-2:]):  # Check last 2 messages
-            if getattr(msg, "source", "") == "categorizer":
-                content = getattr(msg, "content", "")
-                parsed_json = extract_json_from_text(content)
-                if parsed_json and has_categories(parsed_json):
-                    self._terminated = True
-                    return StopMessage(
-                        content="Categorized JSON found in categorizer output.",
-                        source="CategorizationSuccessTermination"
-                    )
+        # Check categorizer output not seen on an earlier call for JSON containing categories
+        for msg in _unchecked_from(messages, "categorizer", self._last_checked_ids):
+            content = getattr(msg, "content", "")
+            parsed_json = extract_json_from_text(content)
+            if parsed_json and has_categories(parsed_json):
+                self._terminated = True
+                return StopMessage(
+                    content="Categorized JSON found in categorizer output.",
+                    source="CategorizationSuccessTermination"
+                )
         return None
     
     async def reset(self) -> None:
         self._terminated = False
+        self._last_checked_ids.clear()
+
+@functools.lru_cache(maxsize=1)
+def _get_model_client() -> AnthropicChatCompletionClient:
+    """Builds the parsing/categorizing model client once and reuses it for every statement."""
+    return AnthropicChatCompletionClient(model=ANTHROPIC_MODEL, api_key=ANTHROPIC_API_KEY)
 
-async def process_single_statement(file_path: str, output_dir: str) -> tuple[bool, str, dict]:
+async def process_single_statement(file_path: str, output_dir: str,
+                                   code_executor: DockerCommandLineCodeExecutor) -> tuple[bool, str, dict]:
     """
-    Process a single statement file.
+    Process a single statement file using an already-started code executor.
     Returns: (success: bool, error_message: str, parsed_data: dict)
     """
     try:
-        statement_text = load_statement(file_path)
+        statement_text = await load_statement(file_path)
 
-        # Create the model client
-        model_client = AnthropicChatCompletionClient(
-            model=ANTHROPIC_MODEL, api_key=ANTHROPIC_API_KEY)
+        # Shared model client (connection pool reused across statements)
+        model_client = _get_model_client()
 
         # Assistant agent: writes code to parse the statement
         assistant = AssistantAgent(
@@ -431,11 +517,7 @@ async def process_single_statement(file_path: str, output_dir: str) -> tuple[boo
             reflect_on_tool_use=True
         )
 
-        # Code executor
-        code_executor = DockerCommandLineCodeExecutor(work_dir=TEMP_DIR)
-        await code_executor.start()
-
-        # Code execution agent
+        # Code execution agent (the container is shared across statements)
         executor_agent = CodeExecutorAgent(
             name="executor",
             code_executor=code_executor
@@ -496,22 +578,24 @@ async def process_single_statement(file_path: str, output_dir: str) -> tuple[boo
 
         parsing_result = await Console(parsing_team.run_stream(task=task))
 
-        # Extract JSON from parsing stage
+        # Extract JSON from parsing stage, keeping the text it came from so
+        # it can be forwarded to the categorizer without re-encoding
         parsed_json = None
+        parsed_json_text = None
         for msg in parsing_result.messages:
             if getattr(msg, "source", "") == "executor":
                 content = getattr(msg, "content", "")
-                parsed_json = extract_json_from_text(content)
-                if parsed_json:
+                found = extract_json_with_source(content)
+                if found is not None and found[0]:
+                    parsed_json, parsed_json_text = found
                     break
 
         if not parsed_json:
-            await code_executor.stop()
             return False, "Failed to parse statement in Stage 1", {}
 
         # STAGE 2: Categorizer processes the parsed JSON
         categorizer_task = TextMessage(
-            content=f"Here is the parsed JSON to categorize:\n```json\n{json.dumps(parsed_json, indent=2)}\n```",
+            content=f"Here is the parsed JSON to categorize:\n```json\n{parsed_json_text}\n```",
             source="user"
         )
 
@@ -525,9 +609,6 @@ async def process_single_statement(file_path: str, output_dir: str) -> tuple[boo
 
         categorization_result = await Console(categorizer_team.run_stream(task=categorizer_task))
 
-        # Stop executor safely
-        await code_executor.stop()
-
         # Search categorization result for final JSON
         final_parsed_json = None
 
@@ -569,8 +650,7 @@ async def process_single_statement(file_path: str, output_dir: str) -> tuple[boo
         # Save individual file result
         filename = Path(file_path).stem
         individual_output_path = Path(output_dir) / f"{filename}_parsed.json"
-        with open(individual_output_path, "w", encoding="utf-8") as f:
-            json.dump(final_parsed_json, f, indent=2, ensure_ascii=False)
+        await asyncio.to_thread(_write_json, individual_output_path, final_parsed_json)
 
         return True, "", final_parsed_json
 
@@ -592,12 +672,35 @@ async def run_parsing_agent(statement_files: List[str]) -> dict:
     successful_files = []
     failed_files = []
     
-    # Process each file
-    for i, file_path in enumerate(statement_files, 1):
+    # Statements are independent and almost entirely I/O-bound (LLM calls,
+    # Docker exec), so they run concurrently, bounded by the semaphore.
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_STATEMENTS)
+
+    # One container for the whole run: starting it costs seconds, far more
+    # than the code it executes. Generated scripts are named by content hash,
+    # so concurrent statements don't overwrite each other's files.
+    code_executor = DockerCommandLineCodeExecutor(work_dir=TEMP_DIR)
+    await code_executor.start()
+
+    async def process_guarded(i: int, file_path: str):
+        async with semaphore:
+            print(f"\n[{i}/{len(statement_files)}] Processing: {Path(file_path).name}")
+            return await process_single_statement(file_path, OUTPUT_DIR, code_executor)
+
+    try:
+        results = await asyncio.gather(
+            *(process_guarded(i, file_path) for i, file_path in enumerate(statement_files, 1)),
+            return_exceptions=True
+        )
+    finally:
+        await code_executor.stop()
+
+    for file_path, result in zip(statement_files, results):
         filename = Path(file_path).name
-        print(f"\n[{i}/{len(statement_files)}] Processing: {filename}")
-        
-        success, error_msg, parsed_data = await process_single_statement(file_path, OUTPUT_DIR)
+        if isinstance(result, BaseException):
+            success, error_msg, parsed_data = False, str(result), {}
+        else:
+            success, error_msg, parsed_data = result
         
         if success:
             print(f"✓ Successfully processed: {filename}")
@@ -1020,8 +1123,7 @@ async def run_complete_pipeline(input_pdf_dir: str, user_question: str):
     
     # Save the combined JSON data
     combined_json_path = COMBINED_JSON_FILE
-    with open(combined_json_path, "w", encoding="utf-8") as f:
-        json.dump(parsed_data, f, indent=2, ensure_ascii=False)
+    await asyncio.to_thread(_write_json, combined_json_path, parsed_data)
     
     print(f"✅ Successfully parsed and combined bank statements")
     print(f"   - Combined data saved to: {combined_json_path}")
@@ -1,14 +1,16 @@
 import asyncio
+import argparse
 from pathlib import Path
 import sys # Used to exit if the file is not found
 import json
-from teams.analyzer_team import get_data_analyzer_team
+from teams.analyzer_team import get_data_analyzer_team, get_direct_delegation
+from agents.file_processor_agent import get_file_processor_agent
 from models.openai_model_client import get_model_client
 from config.docker_util import get_docker_executor, start_docker_executor, stop_docker_executor
-from autogen_agentchat.messages import TextMessage
+from autogen_agentchat.messages import TextMessage, ToolCallSummaryMessage
 from autogen_agentchat.base import TaskResult
 
-async def main():
+async def main(use_team: bool = False):
     # --- Step 1: Add your PDF to the 'temp' folder ---
     pdf_filename = "test_statement.pdf" # Make sure this matches your file name
 
@@ -24,19 +26,27 @@ async def main():
 
     docker_executor = get_docker_executor()
     model_client = get_model_client()
-    team = get_data_analyzer_team(model_client, docker_executor)
-    
+
+    # A bare file path needs no planning: send the planner's delegation line
+    # straight to the File_Processor_Agent and skip the planner LLM round.
+    # --team forces the full planner/selector team, e.g. to exercise the planner.
+    delegation = None if use_team else get_direct_delegation(str(test_pdf_path))
+    if delegation:
+        print("⚡ Input is a file path - routing directly to File_Processor_Agent")
+        team = get_file_processor_agent(model_client, docker_executor)
+        task = delegation
+    else:
+        team = get_data_analyzer_team(model_client, docker_executor)
+        task = f"Please process the PDF file at path '{test_pdf_path}' and extract all transaction data into structured JSON format. The file contains financial statement data that needs to be parsed and standardized."
     
     final_json_output = None
 
     try:
         await start_docker_executor(docker_executor)
 
-        task = f"Please process the PDF file at path '{test_pdf_path}' and extract all transaction data into structured JSON format. The file contains financial statement data that needs to be parsed and standardized."
-
         # --- Updated Loop for Clearer Logging ---
         message_count = 0
-        task_delegated = False
+        task_delegated = delegation is not None
         last_speaker = None
         start_time = asyncio.get_event_loop().time()
         timeout_seconds = 120  # 2 minutes timeout
@@ -51,13 +61,13 @@ async def main():
             print(f"📨 Message #{message_count} - Type: {type(message)}")
             
             # Debug: Check what type of message we're getting
-            if not isinstance(message, TextMessage):
+            if not isinstance(message, (TextMessage, ToolCallSummaryMessage)):
                 print(f"🔍 Non-text message type: {type(message)}")
                 print(f"🔍 Message content: {message}")
                 continue  # Skip non-text messages for now
             
-            if isinstance(message, TextMessage):
-                # It's a regular message from an agent
+            if isinstance(message, (TextMessage, ToolCallSummaryMessage)):
+                # It's a regular message (or a tool result summary) from an agent
                 agent_name = message.source
                 content = message.content
                 last_speaker = agent_name
@@ -127,4 +137,11 @@ async def main():
         print("\n⚠️ Could not retrieve final JSON output from the File_Processor_Agent.")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Extract transactions from the test statement.")
+    parser.add_argument(
+        "--team",
+        action="store_true",
+        help="Run the planner/selector team instead of routing the file straight to the File_Processor_Agent",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(use_team=args.team))
\ No newline at end of file
@@ -1,9 +1,32 @@
+import re
+from pathlib import Path
+from typing import Optional
 from autogen_agentchat.teams import SelectorGroupChat
 from autogen_agentchat.conditions import TextMentionTermination
 from agents.planning_agent import get_planning_agent
 from agents.file_processor_agent import get_file_processor_agent
 from agents.prompts.selector_prompt import SELECTOR_PROMPT
 
+# A request that is nothing but a path to a statement file.
+FILE_PATH_RE = re.compile(r"^\S+\.(pdf|csv)$", re.IGNORECASE)
+STATEMENT_SUFFIXES = {".pdf", ".csv"}  # The only file types the File_Processor_Agent handles
+
+def get_direct_delegation(user_input: str) -> Optional[str]:
+    """
+    Returns the planner's delegation line for a request that is just a file path.
+
+    The planner's only job on such a request is to emit this one line, so the
+    caller can send it straight to the File_Processor_Agent and skip the
+    planner and selector LLM calls. Returns None for anything else.
+    """
+    candidate = user_input.strip().strip("'\"")
+    if Path(candidate).suffix.lower() not in STATEMENT_SUFFIXES:
+        return None
+    # Paths containing spaces fail the regex but are still accepted if the file exists.
+    if FILE_PATH_RE.match(candidate) or Path(candidate).is_file():
+        return f"File_Processor_Agent: Process and extract structured data from the file at {candidate}"
+    return None
+
 def get_data_analyzer_team(model_client, code_executor):
 
     planning_agent = get_planning_agent(model_client)
@@ -216,7 +216,9 @@ def parse_bank_statement_with_autogen_agents(statement_text: str,
                                              model_config: Dict[str, Any] = None, 
                                              output_format: str = "json") -> Union[Dict[str, Any], pd.DataFrame]:
     """
-    Synchronous wrapper for parsing bank statements with AutoGen agents
+    Synchronous wrapper for parsing bank statements with AutoGen agents.
+    Only for callers without a running event loop; async code should await
+    parse_bank_statement_with_agents directly.
     
     Args:
         statement_text: Raw bank statement text
@@ -227,7 +229,19 @@ def parse_bank_statement_with_autogen_agents(statement_text: str,
         Parsed transactions in requested format
     """
     
-    return asyncio.run(parse_bank_statement_with_agents(statement_text, model_config, output_format))
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # No loop in this thread: the usual script entry point.
+        return asyncio.run(parse_bank_statement_with_agents(statement_text, model_config, output_format))
+
+    # Blocking a running loop on a second loop would deadlock (or fail) on
+    # anything bound to the caller's loop, so async callers must await the
+    # coroutine themselves.
+    raise RuntimeError(
+        "parse_bank_statement_with_autogen_agents() cannot be called from a running event loop; "
+        "use 'await parse_bank_statement_with_agents(...)' instead."
+    )
 
 
 # Example usage
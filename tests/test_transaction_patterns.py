@@ -0,0 +1,40 @@
+import pytest
+
+from tools.transaction_patterns import AMOUNT_RE, parse_amount, scan_lines
+
+
+@pytest.mark.parametrize("amount_text, expected", [
+    ("12.34", 12.34),
+    ("1234.56", 1234.56),
+    ("$1,234.56", 1234.56),
+    ("-1,234.56", -1234.56),
+    ("-$45.00", -45.0),
+    ("(45.00)", -45.0),
+    ("$(12.00)", -12.0),
+    ("12.00-", -12.0),
+    ("12.00 CR", -12.0),
+    ("$1,000.00CR", -1000.0),
+])
+def test_parse_amount(amount_text, expected):
+    assert parse_amount(amount_text) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("amount_text", ["1234.56", "12.00-", "12.00 CR", "$(12.00)", "10,000.00"])
+def test_amount_pattern_matches_whole_amount(amount_text):
+    assert AMOUNT_RE.fullmatch(amount_text)
+
+
+def test_scan_lines_keeps_large_and_credit_amounts():
+    text = "\n".join([
+        "01/05 01/06 BEST BUY 00123 1234.56",
+        "01/07 PAYMENT THANK YOU 500.00-",
+        "01/08 01/09 MERCHANT REFUND 12.00 CR",
+        "01/10 COFFEE SHOP $(4.50)",
+        "Statement closing date 01/31/2024",
+    ])
+    transactions = scan_lines(text)
+    assert [t["amount"] for t in transactions] == [1234.56, -500.0, -12.0, -4.5]
+    assert transactions[0]["description"] == "BEST BUY 00123"
+    assert transactions[0]["post_date"] == "01/06"
+    assert transactions[1]["post_date"] is None
+    assert transactions[2]["description"] == "MERCHANT REFUND"
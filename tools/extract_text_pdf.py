@@ -1,6 +1,121 @@
-import pypdf
+import asyncio
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple, Union
+import pypdfium2 as pdfium
 
-def extract_text_from_pdf(file_path: str) -> str:
+# Documents shorter than this are extracted in-process; spinning up worker
+# processes costs more than it saves on a handful of pages.
+PARALLEL_PAGE_THRESHOLD = 8
+
+# PDFium is not thread-safe, so every in-process PDFium call made by the
+# streaming reader goes through this single thread.
+_PDFIUM_THREAD = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdfium")
+
+# In-process LRU of extracted text, keyed by (absolute path, mtime_ns, size).
+# Re-running the same statement skips the decode entirely, and any edit to
+# the file changes its key, so stale text is never served.
+PDF_TEXT_CACHE_SIZE = 64
+_PDF_TEXT_CACHE: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+
+def _pdf_identity(file_path: str) -> Tuple[str, int, int]:
+    st = os.stat(file_path)
+    return os.path.abspath(file_path), st.st_mtime_ns, st.st_size
+
+def cached_pdf_text(file_path: str) -> Optional[str]:
+    """Returns the previously extracted text of an unchanged PDF, or None."""
+    try:
+        key = _pdf_identity(file_path)
+    except OSError:
+        return None
+    text = _PDF_TEXT_CACHE.get(key)
+    if text is not None:
+        _PDF_TEXT_CACHE.move_to_end(key)
+    return text
+
+def remember_pdf_text(file_path: str, text: str) -> None:
+    """Stores successfully extracted text in the LRU, evicting the oldest entry."""
+    try:
+        key = _pdf_identity(file_path)
+    except OSError:
+        return
+    _PDF_TEXT_CACHE[key] = text
+    _PDF_TEXT_CACHE.move_to_end(key)
+    while len(_PDF_TEXT_CACHE) > PDF_TEXT_CACHE_SIZE:
+        _PDF_TEXT_CACHE.popitem(last=False)
+
+def read_pdf_bytes(file_path: str) -> bytes:
+    """
+    Reads a whole PDF into memory with one sequential read.
+
+    PDF parsers seek around the file (xref table, object streams), which on a
+    cold cache turns into many small random reads. Loading the bytes up front
+    replaces those with a single large read, after which parsing is in-memory.
+    """
+    return Path(file_path).read_bytes()
+
+def _page_text(pdf: "pdfium.PdfDocument", index: int) -> str:
+    """Extracts the text of one page of an open PDFium document."""
+    page = pdf[index]
+    try:
+        textpage = page.get_textpage()
+        try:
+            return textpage.get_text_range()
+        finally:
+            textpage.close()
+    finally:
+        page.close()
+
+def _extract_page_range(args: Tuple[Union[str, bytes], int, int]) -> List[str]:
+    """
+    Worker: extracts the text of pages [start, stop) of a PDF with PDFium.
+
+    Each worker opens the document itself because PDFium objects cannot be
+    shared across processes. The source may be a path or the PDF's bytes.
+    """
+    source, start, stop = args
+    pdf = pdfium.PdfDocument(source)
+    try:
+        return [_page_text(pdf, index) for index in range(start, stop)]
+    finally:
+        pdf.close()
+
+def extract_pages_text(file_path: str, max_workers: Optional[int] = None) -> List[str]:
+    """
+    Extracts the text of every page of a PDF, in page order.
+
+    Pages are decoded with PDFium and, for longer documents, split into
+    contiguous ranges that are processed in parallel worker processes.
+
+    Args:
+        file_path (str): The local path to the PDF file.
+        max_workers (int, optional): Maximum worker processes. Defaults to the
+                                     CPU count; pass 1 to stay in-process.
+
+    Returns:
+        List[str]: One string per page.
+    """
+    pdf_bytes = read_pdf_bytes(file_path)
+    pdf = pdfium.PdfDocument(pdf_bytes)
+    page_count = len(pdf)
+    pdf.close()
+
+    workers = min(max_workers or os.cpu_count() or 1, page_count)
+    if workers <= 1 or page_count < PARALLEL_PAGE_THRESHOLD:
+        # The bytes are already in memory, so decode from them directly.
+        return _extract_page_range((pdf_bytes, 0, page_count))
+
+    # Contiguous page ranges keep the number of document opens per worker low,
+    # and `map` preserves the original page order. Workers get the bytes
+    # already in memory rather than re-reading the file.
+    step = -(-page_count // workers)
+    ranges = [(pdf_bytes, start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [text for chunk in executor.map(_extract_page_range, ranges) for text in chunk]
+
+def extract_text_from_pdf(file_path: str, max_workers: Optional[int] = None) -> str:
     """
     Extracts all text content from a given PDF file.
 
@@ -9,16 +124,51 @@ def extract_text_from_pdf(file_path: str) -> str:
 
     Args:
         file_path (str): The local path to the PDF file.
+        max_workers (int, optional): Maximum worker processes used for page
+                                     extraction; pass 1 to stay in-process.
 
     Returns:
         str: A single string containing all the extracted text from the PDF.
              Returns an error message string if extraction fails.
     """
+    cached = cached_pdf_text(file_path)
+    if cached is not None:
+        return cached
     try:
-        reader = pypdf.PdfReader(file_path)
-        full_text = ""
-        for page in reader.pages:
-            full_text += page.extract_text() + "\n--- End of Page ---\n"
-        return full_text
+        pages = extract_pages_text(file_path, max_workers=max_workers)
+        text = "".join(page_text + "\n--- End of Page ---\n" for page_text in pages)
+        remember_pdf_text(file_path, text)
+        return text
     except Exception as e:
         return f"Error extracting text from PDF: {str(e)}"
+
+def _open_pdf_document(file_path: str) -> "pdfium.PdfDocument":
+    """Reads the PDF bytes and opens them with PDFium in one blocking call."""
+    return pdfium.PdfDocument(read_pdf_bytes(file_path))
+
+async def extract_text_from_pdf_stream(file_path: str) -> AsyncIterator[str]:
+    """
+    Yields the text of a PDF one page at a time.
+
+    The file is read in one sequential read and every PDFium call runs on a
+    dedicated thread, so the event loop is free to make progress on other
+    work (e.g. LLM calls for earlier pages) while the next page is being
+    decoded. The text comes from the same engine as `extract_text_from_pdf`,
+    so both paths produce identical text (and identical cache keys).
+
+    Args:
+        file_path (str): The local path to the PDF file.
+
+    Yields:
+        str: The extracted text of each page, in page order.
+    """
+    loop = asyncio.get_running_loop()
+    # Opening the document is one sequential unit of work, so it takes a
+    # single thread hop rather than one for the read and one for the parse.
+    pdf = await loop.run_in_executor(_PDFIUM_THREAD, _open_pdf_document, file_path)
+    try:
+        page_count = await loop.run_in_executor(_PDFIUM_THREAD, len, pdf)
+        for index in range(page_count):
+            yield await loop.run_in_executor(_PDFIUM_THREAD, _page_text, pdf, index)
+    finally:
+        await loop.run_in_executor(_PDFIUM_THREAD, pdf.close)
@@ -0,0 +1,67 @@
+import contextlib
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+from config.constants import PARSE_CACHE_DIR
+
+def file_digest(file_path: str) -> str:
+    """
+    Returns a SHA-256 hex digest of a file's contents.
+
+    Args:
+        file_path (str): The local path to the file.
+
+    Returns:
+        str: The hex digest, suitable for use as a cache key.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def text_digest(text: str, model_name: str) -> str:
+    """
+    Returns a SHA-256 hex digest of a piece of text and the model that parsed it.
+
+    The model name is part of the key so switching models does not serve
+    results produced by a different one.
+    """
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+def load_cached(key: str) -> Optional[str]:
+    """Returns the cached JSON string for `key`, or None on a cache miss."""
+    try:
+        return (Path(PARSE_CACHE_DIR) / f"{key}.json").read_text(encoding="utf-8")
+    except OSError:
+        return None
+
+def store_cached(key: str, json_str: str) -> None:
+    """
+    Stores a JSON string under `key`.
+
+    The file is written to a temporary path and moved into place, so a
+    concurrent reader never sees a partially written entry. Failures are
+    ignored because the cache is only an optimization.
+    """
+    try:
+        cache_dir = Path(PARSE_CACHE_DIR)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(json_str)
+            os.replace(tmp_path, cache_dir / f"{key}.json")
+        except BaseException:
+            # Don't leave the partial temp file behind in the cache dir
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+            raise
+    except OSError:
+        pass
@@ -1,11 +1,95 @@
 import asyncio
+import hashlib
 import json
+import re
+import shutil
+from pathlib import Path
 from autogen_agentchat.agents import AssistantAgent, CodeExecutorAgent
 from autogen_agentchat.messages import TextMessage
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.conditions import TextMentionTermination, MaxMessageTermination
+from autogen_core import CancellationToken
+from autogen_core.code_executor import CodeBlock
 from agents.prompts.unstructured_text_parser_message import UNSTRUCTURED_TEXT_PARSER_SYSTEM_MESSAGE
-from typing import List, Dict
+from tools.script_cache import text_fingerprint, lookup_script, store_script, forget_script
+from typing import List, Dict, Optional
+
+# Built once at import. Every Code_Writer conversation then opens with the
+# byte-identical system prompt, which the provider's automatic prefix caching
+# can reuse instead of prefilling it again.
+PARSER_SYSTEM_MESSAGE = UNSTRUCTURED_TEXT_PARSER_SYSTEM_MESSAGE + """
+
+CRITICAL INSTRUCTIONS:
+1. ALWAYS use the EXACT unstructured text provided in the user message - NEVER use sample data
+2. Write Python code that processes the actual input text, not placeholder text
+3. Start each response with a brief plan of what you're doing or fixing
+4. When you have working code that produces valid JSON, include both the final code AND say "PARSING_COMPLETE"
+5. Focus on extracting real transaction data from the provided text
+6. If the text extraction works but produces empty results, still output the empty JSON array []
+7. NEVER respond with just "PARSING_COMPLETE" - always include code when executor needs it
+"""
+
+# Pattern bank the generated parser scripts import from their working directory.
+TRANSACTION_PATTERNS_MODULE = Path(__file__).with_name("transaction_patterns.py")
+
+def _install_transaction_patterns(code_executor_instance) -> None:
+    """Copies the pattern bank into the executor's work dir so scripts can import it."""
+    try:
+        work_dir = Path(code_executor_instance.work_dir)
+        shutil.copyfile(TRANSACTION_PATTERNS_MODULE, work_dir / TRANSACTION_PATTERNS_MODULE.name)
+    except (AttributeError, OSError) as e:
+        print(f"Could not install transaction_patterns module: {e}")
+
+_PYTHON_BLOCK_RE = re.compile(r"```python\s*\n(.*?)```", re.DOTALL)
+
+def _extract_python_code(content: str) -> Optional[str]:
+    """Returns the python code blocks of a Code_Writer message joined together, or None."""
+    blocks = _PYTHON_BLOCK_RE.findall(content)
+    return "\n\n".join(block.strip() for block in blocks) if blocks else None
+
+def _extract_json_array(content: str) -> Optional[str]:
+    """Returns the outermost JSON array in executor output if it is valid, else None."""
+    start_idx = content.find('[')
+    end_idx = content.rfind(']')
+    if start_idx == -1 or end_idx == -1 or start_idx >= end_idx:
+        return None
+    potential_json = content[start_idx:end_idx+1]
+    try:
+        json.loads(potential_json)
+    except json.JSONDecodeError:
+        return None
+    return potential_json
+
+async def _replay_cached_script(fingerprint: str, input_file: str, code_executor_instance) -> Optional[str]:
+    """
+    Re-runs the parsing script cached for this statement layout against new text.
+
+    Returns the JSON string on success, or None (after evicting the script) if
+    there is no cached script or it no longer produces valid, non-empty JSON.
+    """
+    cached = lookup_script(fingerprint)
+    if cached is None:
+        return None
+
+    script, cached_input_file = cached
+    print(f"\n--- Replaying cached parser script for layout {fingerprint[:12]} ---")
+    try:
+        result = await code_executor_instance.execute_code_blocks(
+            [CodeBlock(code=script.replace(cached_input_file, input_file), language="python")],
+            CancellationToken(),
+        )
+    except Exception as e:
+        print(f"Cached script execution failed: {e}")
+        result = None
+
+    json_str = _extract_json_array(result.output) if result is not None and result.exit_code == 0 else None
+    if json_str is None or not json.loads(json_str):
+        print("Cached script did not produce transactions - falling back to the code writer")
+        forget_script(fingerprint)
+        return None
+
+    print(f"✅ Cached script produced valid JSON ({len(json_str)} characters)")
+    return json_str
 
 async def parse_unstructured_text(unstructured_text: str, model_client, code_executor_instance) -> str:
     """
@@ -35,24 +119,32 @@ async def parse_unstructured_text(unstructured_text: str, model_client, code_exe
     print(f"LINE COUNT: {len(unstructured_text.splitlines())} lines")
     print("="*60)
     
-    # Enhanced system message with stricter instructions
-    enhanced_system_message = UNSTRUCTURED_TEXT_PARSER_SYSTEM_MESSAGE + """
+    # Make `from transaction_patterns import scan_lines` available to the generated code
+    _install_transaction_patterns(code_executor_instance)
+
+    # Save the text in the executor's work dir so the generated script reads it
+    # from a file instead of embedding it; that keeps the script reusable for
+    # other statements with the same layout.
+    fingerprint = text_fingerprint(unstructured_text)
+    input_file = f"parse_input_{hashlib.sha256(unstructured_text.encode('utf-8')).hexdigest()[:16]}.txt"
+    try:
+        (Path(code_executor_instance.work_dir) / input_file).write_text(unstructured_text, encoding="utf-8")
+        can_cache_script = True
+    except (AttributeError, OSError) as e:
+        print(f"Could not write parser input file: {e}")
+        can_cache_script = False
+
+    # A statement with a known layout skips the code-writer conversation entirely.
+    if can_cache_script:
+        replayed_json = await _replay_cached_script(fingerprint, input_file, code_executor_instance)
+        if replayed_json is not None:
+            return replayed_json
 
-CRITICAL INSTRUCTIONS:
-1. ALWAYS use the EXACT unstructured text provided in the user message - NEVER use sample data
-2. Write Python code that processes the actual input text, not placeholder text
-3. Start each response with a brief plan of what you're doing or fixing
-4. When you have working code that produces valid JSON, include both the final code AND say "PARSING_COMPLETE"
-5. Focus on extracting real transaction data from the provided text
-6. If the text extraction works but produces empty results, still output the empty JSON array []
-7. NEVER respond with just "PARSING_COMPLETE" - always include code when executor needs it
-"""
-    
     # 1. Define the agents for the conversational sub-task
     code_writer = AssistantAgent(
         name="Code_Writer",
         model_client=model_client,
-        system_message=enhanced_system_message,
+        system_message=PARSER_SYSTEM_MESSAGE,
     )
 
     code_executor_agent = CodeExecutorAgent(
@@ -66,6 +158,11 @@ CRITICAL INSTRUCTIONS:
     team = RoundRobinGroupChat([code_writer, code_executor_agent], termination_condition=termination_condition)
 
     # 3. Create a more specific task message
+    input_file_instruction = (
+        f"\n- The same text is saved in the working directory as `{input_file}`. Your code must load it with"
+        f"\n  `text = open(\"{input_file}\", encoding=\"utf-8\").read()` instead of pasting the text into the script."
+        if can_cache_script else ""
+    )
     task_message = TextMessage(
         content=f"""Your task is to write Python code that parses the following ACTUAL TEXT and extracts financial transactions as JSON.
 
@@ -73,7 +170,7 @@ REQUIREMENTS:
 - Use the EXACT text provided below (not sample data)
 - Extract ALL transaction-like entries from this specific text
 - Output a JSON array of transactions with fields: date, description, amount
-- After successful execution, respond with "PARSING_COMPLETE"
+- After successful execution, respond with "PARSING_COMPLETE"{input_file_instruction}
 
 TEXT TO PARSE (USE THIS EXACT TEXT):
 ---START OF ACTUAL TEXT---
@@ -89,6 +186,8 @@ Write Python code to process this exact text and extract transaction data.""",
     print("\n--- Code Writer and Executor Conversation ---")
     
     valid_json_found = None
+    last_code = None
+    successful_code = None
     consecutive_no_code = 0
     parsing_complete_found = False
     
@@ -118,6 +217,7 @@ Write Python code to process this exact text and extract transaction data.""",
                             print(f"\n✅ Valid JSON found with {len(parsed_json)} transactions")
                             print(f"JSON preview: {potential_json[:200]}...")
                             valid_json_found = json_match
+                            successful_code = last_code
                     except json.JSONDecodeError as e:
                         print(f"JSON decode error: {e}")
                         pass
@@ -136,6 +236,7 @@ Write Python code to process this exact text and extract transaction data.""",
                 
                 # Check for completion signals from code writer AND valid JSON
                 if message.source == "Code_Writer" and isinstance(content, str):
+                    last_code = _extract_python_code(content) or last_code
                     if "PARSING_COMPLETE" in content:
                         parsing_complete_found = True
                         print(f"\n✅ Code writer signals completion")
@@ -174,6 +275,9 @@ Write Python code to process this exact text and extract transaction data.""",
     print("---")
     
     if valid_json_found:
+        # Remember the script for this layout if it actually read the input file.
+        if can_cache_script and successful_code and input_file in successful_code:
+            store_script(fingerprint, successful_code, input_file)
         print(f"\n--- Returning Valid JSON Found During Conversation ---")
         print(valid_json_found)
         print("-" * 50)
@@ -0,0 +1,81 @@
+import hashlib
+import re
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Optional, Tuple
+from config.constants import SCRIPT_CACHE_DB
+
+# Number of leading non-empty lines that make up a statement's "layout".
+FINGERPRINT_LINES = 15
+
+_DIGIT_RE = re.compile(r"\d")
+_LETTERS_RE = re.compile(r"[A-Za-z]+")
+_SPACE_RE = re.compile(r"\s+")
+
+def text_fingerprint(text: str) -> str:
+    """
+    Returns a structural fingerprint of a statement's text.
+
+    Lines without digits (bank name, column headers) are kept as-is, while
+    lines with digits (dates, amounts, transactions) are reduced to their
+    shape, e.g. '01/05 STARBUCKS 4.50' -> '99/99 a 9.99'. Two statements from
+    the same bank and layout therefore share a fingerprint even when their
+    transactions differ.
+    """
+    signature = []
+    for line in text.splitlines():
+        line = _SPACE_RE.sub(" ", line).strip()
+        if not line:
+            continue
+        if _DIGIT_RE.search(line):
+            line = _LETTERS_RE.sub("a", _DIGIT_RE.sub("9", line))
+        signature.append(line.lower())
+        if len(signature) == FINGERPRINT_LINES:
+            break
+    return hashlib.sha256("\n".join(signature).encode("utf-8")).hexdigest()
+
+def _connect() -> sqlite3.Connection:
+    Path(SCRIPT_CACHE_DB).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(SCRIPT_CACHE_DB)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS scripts ("
+        "fingerprint TEXT PRIMARY KEY, script TEXT NOT NULL, input_file TEXT NOT NULL)"
+    )
+    return conn
+
+def lookup_script(fingerprint: str) -> Optional[Tuple[str, str]]:
+    """
+    Returns the cached (script, input_file) pair for a fingerprint, or None.
+
+    `input_file` is the file name the script reads its text from, so callers
+    can point a replay at a different input file.
+    """
+    try:
+        with closing(_connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT script, input_file FROM scripts WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+        return row
+    except sqlite3.Error as e:
+        print(f"Script cache lookup failed: {e}")
+        return None
+
+def store_script(fingerprint: str, script: str, input_file: str) -> None:
+    """Stores (or replaces) the parsing script that worked for a fingerprint."""
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO scripts (fingerprint, script, input_file) VALUES (?, ?, ?)",
+                (fingerprint, script, input_file),
+            )
+    except sqlite3.Error as e:
+        print(f"Script cache store failed: {e}")
+
+def forget_script(fingerprint: str) -> None:
+    """Drops a cached script, e.g. after it failed on a new statement."""
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute("DELETE FROM scripts WHERE fingerprint = ?", (fingerprint,))
+    except sqlite3.Error as e:
+        print(f"Script cache delete failed: {e}")
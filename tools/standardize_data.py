@@ -2,10 +2,21 @@ import pandas as pd
 import json
 from typing import List, Dict, Union
 
-def standardize_data(json_data: str) -> str:
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _dumps_compact(obj) -> str:
+    """Serializes to compact JSON, using orjson's C encoder when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"))
+
+def standardize_data(json_data: Union[str, List[Dict[str, Union[str, float]]]]) -> str:
     """
-    Takes a JSON string of transactions, cleans the data, sorts it,
-    and returns the standardized data as a JSON string.
+    Takes a JSON string (or an already-parsed list) of transactions, cleans the
+    data, sorts it, and returns the standardized data as a JSON string.
 
     Standardization includes:
     1. Converting date strings to a consistent 'YYYY-MM-DD' format.
@@ -13,14 +24,18 @@ def standardize_data(json_data: str) -> str:
     3. Sorting all transactions chronologically by date.
 
     Args:
-        json_data (str): A JSON string representing a list of transaction objects.
-                         Each object must have 'date', 'description', and 'amount'.
+        json_data (str | list): A JSON string, or an already-parsed list, of transaction
+                                objects. Each object must have 'date', 'description', and 'amount'.
+                                Passing the list avoids a redundant serialize/parse round-trip.
 
     Returns:
         str: A cleaned, sorted, and standardized JSON string of transactions.
     """
     try:
-        transactions: List[Dict[str, Union[str, float]]] = json.loads(json_data)
+        if isinstance(json_data, str):
+            transactions: List[Dict[str, Union[str, float]]] = json.loads(json_data)
+        else:
+            transactions = json_data
         
         # --- Data Cleaning and Type Conversion ---
         for t in transactions:
@@ -38,7 +53,9 @@ def standardize_data(json_data: str) -> str:
         # Sort the list of dictionaries by the 'date' key
         sorted_transactions = sorted(transactions, key=lambda t: t['date'])
 
-        return json.dumps(sorted_transactions, indent=2)
+        # Compact separators: this is the final tool boundary and the consumer
+        # is another model/parser, so indentation only adds bytes and tokens.
+        return _dumps_compact(sorted_transactions)
 
     except (json.JSONDecodeError, TypeError, KeyError) as e:
         return json.dumps({"error": f"Failed to standardize data: {str(e)}"})
@@ -0,0 +1,119 @@
+"""
+A pre-built pattern bank for finding transactions in bank statement text.
+
+This module is copied into the code executor's working directory so that the
+parser scripts written by the LLM can simply `from transaction_patterns import
+scan_lines` instead of re-deriving (and re-compiling) their own regexes.
+
+It must stay self-contained: only the standard library plus the optional
+`google-re2` package. When `re2` is installed every pattern runs on its
+linear-time DFA engine; otherwise the stdlib `re` module is used. All patterns
+stay within the RE2-compatible subset (no backreferences or lookarounds).
+"""
+from datetime import datetime
+from typing import Optional
+
+try:
+    import re2 as re
+except ImportError:
+    import re
+
+# Date formats seen on statements: MM/DD, MM/DD/YY, MM/DD/YYYY, YYYY-MM-DD.
+DATE_PATTERN = r"\d{1,2}/\d{1,2}(?:/\d{2,4})?|\d{4}-\d{2}-\d{2}"
+
+# Amounts such as 12.34, 1234.56, -1,234.56, $99.00, (45.00), $(45.00),
+# and credits written with a trailing minus or CR: 12.00- or 12.00 CR.
+AMOUNT_PATTERN = r"[-$(]{0,3}\d[\d,]*\.\d{2}\)?(?:-|\s?CR)?"
+
+DATE_RE = re.compile(DATE_PATTERN)
+AMOUNT_RE = re.compile(AMOUNT_PATTERN)
+
+# One anchored, single-pass pattern per transaction line: an optional second
+# (post) date, a bounded description and a trailing amount.
+TRANSACTION_LINE_RE = re.compile(
+    r"^\s*(?P<date>" + DATE_PATTERN + r")\s+"
+    r"(?:(?P<post_date>" + DATE_PATTERN + r")\s+)?"
+    r"(?P<description>\S.{0,160}?)\s+"
+    r"(?P<amount>" + AMOUNT_PATTERN + r")\s*$"
+)
+
+# Candidate date formats, each with a shape check so format detection never
+# depends on strptime raising. The shapes are mutually exclusive.
+DATE_FORMATS = [
+    ("%m/%d/%Y", re.compile(r"\d{1,2}/\d{1,2}/\d{4}")),
+    ("%m/%d/%y", re.compile(r"\d{1,2}/\d{1,2}/\d{2}")),
+    ("%Y-%m-%d", re.compile(r"\d{4}-\d{2}-\d{2}")),
+    ("%m/%d", re.compile(r"\d{1,2}/\d{1,2}")),
+]
+
+def detect_date_format(dates: list, sample_size: int = 20) -> Optional[str]:
+    """
+    Detects the one date format used by a statement from its first dates.
+
+    Args:
+        dates (list): Date strings in statement order.
+        sample_size (int): How many leading dates to check.
+
+    Returns:
+        str | None: The strptime format every sampled date fits, or None.
+    """
+    sample = [d for d in dates[:sample_size] if d]
+    if not sample:
+        return None
+    for fmt, shape in DATE_FORMATS:
+        if all(shape.fullmatch(d) for d in sample):
+            return fmt
+    return None
+
+def to_iso_date(date_text: str, fmt: str, year: Optional[int] = None) -> str:
+    """
+    Converts a date string in a known format to 'YYYY-MM-DD'.
+
+    Year-less dates (MM/DD) take `year`, which should come from the statement
+    period; without it the result has year 1900.
+    """
+    if fmt == "%m/%d" and year is not None:
+        return datetime.strptime(f"{date_text}/{year}", "%m/%d/%Y").date().isoformat()
+    return datetime.strptime(date_text, fmt).date().isoformat()
+
+def parse_amount(amount_text: str) -> float:
+    """
+    Converts an amount string into a float.
+
+    Handles '$1,234.56', '1234.56', '(45.00)', '$(45.00)', '-$45.00' and the
+    credit forms '12.00-' and '12.00 CR', which are all negative.
+    """
+    text = "".join(amount_text.replace("$", "").split())
+    negative = False
+    if text.upper().endswith("CR"):
+        negative, text = True, text[:-2]
+    if text.endswith("-"):
+        negative, text = True, text[:-1]
+    if text.startswith("-") or text.startswith("("):
+        negative = True
+    value = float(text.strip("-()").replace(",", ""))
+    return -value if negative else value
+
+def scan_lines(text: str) -> list:
+    """
+    Scans statement text line by line and returns every transaction-like line.
+
+    Args:
+        text (str): The raw statement text.
+
+    Returns:
+        list: Dicts with 'date', 'post_date' (or None), 'description' and
+              'amount' (float), in the order they appear in the text.
+    """
+    transactions = []
+    for line in text.splitlines():
+        match = TRANSACTION_LINE_RE.match(line)
+        if not match:
+            continue
+        transactions.append({
+            "date": match.group("date"),
+            "post_date": match.group("post_date"),
+            "description": " ".join(match.group("description").split()),
+            "amount": parse_amount(match.group("amount")),
+        })
+    return transactions